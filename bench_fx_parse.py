@@ -0,0 +1,29 @@
+import glob
+import os
+import sys
+import timeit
+
+from main import FX_EXTRACTORS, extract_usd_idr_price
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "google_finance_*.html")
+
+
+def bench(fn, arg, number):
+    best = min(timeit.repeat(lambda: fn(arg), number=number, repeat=5))
+    return best / number * 1000
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for path in sorted(glob.glob(SAMPLES)):
+        with open(path, "rb") as f:
+            content = f.read()
+        text = content.decode("utf-8")
+        print(f"{os.path.basename(path)} ({len(content) // 1024} KB)")
+        for name, fn in FX_EXTRACTORS.items():
+            print(f"  {name:<8} {bench(fn, text, number):8.3f} ms  -> {fn(text)}")
+        print(f"  {'chain':<8} {bench(extract_usd_idr_price, content, number):8.3f} ms  -> {extract_usd_idr_price(content)}")
+
+
+if __name__ == "__main__":
+    main()
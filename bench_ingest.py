@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+from main import INGEST_DEDUP_WINDOW, INGEST_MAX_LATE, INGEST_RESET_AFTER, TickPipeline, parse_updated_at
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "treasury_gold_rate.jsonl")
+
+
+# What the recorded sample must come out as: duplicates, broken, invalid and late
+# payloads dropped, and the two stale 07:00 ticks at the end rejected too.
+EXPECTED = [
+    "2025-01-02 09:00:01", "2025-01-02 09:00:04", "2025-01-02 09:00:09",
+    "2025-01-02 09:00:15", "2025-01-02 09:00:15.500000",
+]
+
+
+def replay(payloads, dedup_size=INGEST_DEDUP_WINDOW):
+    pipeline = TickPipeline(dedup_size, INGEST_MAX_LATE, INGEST_RESET_AFTER)
+    admitted = [fields for fields in map(pipeline.process, payloads) if fields]
+    return pipeline, admitted
+
+
+def payload(updated_at, buying_rate=1520000):
+    return b'{"data":{"buying_rate":%d,"selling_rate":%d,"updated_at":"%s"}}' % (
+        buying_rate, buying_rate - 52000, updated_at.encode()
+    )
+
+
+def check_monotonic(admitted):
+    keys = [updated_at for _, _, updated_at in admitted]
+    assert len(keys) == len(set(keys)), f"duplicate admitted: {keys}"
+    times = [parse_updated_at(key) for key in keys]
+    assert times == sorted(times), f"admitted out of order: {keys}"
+
+
+def check():
+    # A key that left the dedup window must not come back, even far behind the newest.
+    _, admitted = replay([payload(t) for t in (
+        "2025-01-02 07:00:00", "2025-01-02 07:00:05", "2025-01-02 09:00:00", "2025-01-02 09:00:05",
+        "2025-01-02 07:00:00", "2025-01-02 07:00:05",
+    )], dedup_size=3)
+    assert [a[2] for a in admitted] == ["2025-01-02 07:00:00", "2025-01-02 07:00:05", "2025-01-02 09:00:00", "2025-01-02 09:00:05"], admitted
+    check_monotonic(admitted)
+
+    # The same stale response repeated is not a clock reset.
+    _, admitted = replay([payload("2025-01-02 09:00:00")] + [payload("2025-01-02 07:00:00")] * (INGEST_RESET_AFTER + 2))
+    assert [a[2] for a in admitted] == ["2025-01-02 09:00:00"], admitted
+
+    # A backwards jump that keeps moving forward is one, once it persists.
+    later = [f"2025-01-02 07:00:{i:02d}" for i in range(INGEST_RESET_AFTER + 1)]
+    pipeline, admitted = replay([payload("2025-01-02 09:00:00")] + [payload(t) for t in later])
+    assert [a[2] for a in admitted] == ["2025-01-02 09:00:00"] + later[INGEST_RESET_AFTER - 1:], admitted
+    assert pipeline.counts["order.reset"] == 1, pipeline.counts
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with open(SAMPLES, "rb") as f:
+        payloads = [line.rstrip(b"\n") for line in f if line.strip()]
+
+    pipeline, admitted = replay(payloads)
+    print(f"{os.path.basename(SAMPLES)}: {len(payloads)} payloads, {len(admitted)} admitted")
+    for key, n in sorted(pipeline.counts.items()):
+        print(f"  {key:<20} {n}")
+    assert [updated_at for _, _, updated_at in admitted] == EXPECTED, admitted
+    check_monotonic(admitted)
+    check()
+    print("checks passed")
+
+    # Steady state is mostly duplicates of the newest tick; time that path too.
+    start = time.perf_counter()
+    for _ in range(number):
+        pipeline.process(payloads[0])
+    print(f"duplicate payload: {(time.perf_counter() - start) / number * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import orjson
+import uvicorn
+import websockets
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLES = os.path.join(HERE, "samples")
+FX_SAMPLE_PRICE = "15,618.5000"
+
+
+class FakeTreasury:
+    # Stand-in for the treasury gold/rate POST: a new tick every 1/rate seconds. The
+    # wall-clock time each tick appeared is kept so clients can measure tick-to-client delay.
+    def __init__(self, rate):
+        self.rate = rate
+        self.start = time.time()
+        self.base = datetime(2025, 1, 1)
+        self.buy = 1500000
+        self.index = -1
+        self.emitted = {}
+
+    def current(self):
+        index = int((time.time() - self.start) * self.rate)
+        while self.index < index:
+            self.index += 1
+            self.buy += random.choice((-1000, 0, 1000))
+            self.updated_at = (self.base + timedelta(seconds=self.index)).strftime("%Y-%m-%d %H:%M:%S")
+            self.emitted[self.updated_at] = self.start + self.index / self.rate
+
+    async def endpoint(self, request):
+        self.current()
+        return JSONResponse({"data": {"buying_rate": self.buy, "selling_rate": self.buy - 50000, "updated_at": self.updated_at}})
+
+
+class FakeFx:
+    # Stand-ins for the FX sources, serving the recorded samples. The live ones
+    # (Google Finance page, Yahoo chart JSON) move together every two seconds.
+    def __init__(self):
+        self.start = time.time()
+        with open(os.path.join(SAMPLES, "google_finance_usd_idr.html"), encoding="utf-8") as f:
+            self.page = f.read()
+        with open(os.path.join(SAMPLES, "yahoo_usd_idr.json"), "rb") as f:
+            self.yahoo_data = orjson.loads(f.read())
+        with open(os.path.join(SAMPLES, "erapi_usd_idr.json"), "rb") as f:
+            self.erapi_body = f.read()
+
+    def price(self):
+        return 15600.5 + int((time.time() - self.start) / 2) % 100
+
+    async def google(self, request):
+        page = self.page.replace(FX_SAMPLE_PRICE, f"{self.price():,.4f}")
+        return Response(page, media_type="text/html; charset=utf-8")
+
+    async def yahoo(self, request):
+        self.yahoo_data["chart"]["result"][0]["meta"]["regularMarketPrice"] = self.price()
+        return Response(orjson.dumps(self.yahoo_data), media_type="application/json")
+
+    async def erapi(self, request):
+        return Response(self.erapi_body, media_type="application/json")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def proc_cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except OSError:
+        return None
+
+
+def proc_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def parse_metrics(text):
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def fast_client(url, treasury, latencies, stats, stop):
+    async with websockets.connect(url, max_size=None) as ws:
+        stats["connected"] += 1
+        while not stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), 0.5)
+            except TimeoutError:
+                continue
+            now = time.time()
+            data = orjson.loads(raw)
+            stats["messages"] += 1
+            if data["type"] == "delta" and "history" in data:
+                for row in data["history"]["append"]:
+                    emitted = treasury.emitted.get(row["created_at"])
+                    if emitted is not None:
+                        latencies.append(now - emitted)
+
+
+async def slow_client(url, delay, stats, stop):
+    # A tiny receive queue means the library stops reading the socket, so the server
+    # sees real backpressure instead of a client that buffers everything.
+    try:
+        async with websockets.connect(url, max_size=None, max_queue=1) as ws:
+            stats["connected"] += 1
+            while not stop.is_set():
+                await ws.recv()
+                await asyncio.sleep(delay)
+    except websockets.ConnectionClosed:
+        stats["slow_closed"] += 1
+
+
+async def run_clients(args, port, treasury):
+    url = f"ws://127.0.0.1:{port}/ws?format=json"
+    latencies = []
+    stats = {"connected": 0, "messages": 0, "slow_closed": 0}
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(fast_client(url, treasury, latencies, stats, stop)) for _ in range(args.clients)]
+    tasks += [asyncio.create_task(slow_client(url, args.slow_delay, stats, stop)) for _ in range(args.slow)]
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.sleep(1)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return latencies, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan-out load test against local fake upstreams")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--slow", type=int, default=5)
+    parser.add_argument("--slow-delay", type=float, default=2.0)
+    parser.add_argument("--rate", type=float, default=5.0, help="treasury ticks per second")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--max-p99", type=float, default=0, help="fail if p99 tick-to-client ms exceeds this")
+    args = parser.parse_args()
+
+    treasury = FakeTreasury(args.rate)
+    fx = FakeFx()
+    treasury_port, fx_port, app_port = free_port(), free_port(), free_port()
+    fakes = [
+        serve_in_thread(Starlette(routes=[Route("/rate", treasury.endpoint, methods=["POST"])]), treasury_port),
+        serve_in_thread(Starlette(routes=[
+            Route("/quote", fx.google), Route("/yahoo", fx.yahoo), Route("/erapi", fx.erapi)
+        ]), fx_port),
+    ]
+
+    env = dict(os.environ)
+    env.pop("TELEGRAM_TOKEN", None)
+    env.update({
+        "TREASURY_API_URL": f"http://127.0.0.1:{treasury_port}/rate",
+        "FX_URL": f"http://127.0.0.1:{fx_port}/quote",
+        "FX_YAHOO_URL": f"http://127.0.0.1:{fx_port}/yahoo",
+        "FX_ERAPI_URL": f"http://127.0.0.1:{fx_port}/erapi",
+        "TICK_STORE_PATH": "",
+        "INGEST_MODE": "local",
+    })
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"],
+        cwd=HERE, env=env,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{app_port}"
+        for _ in range(100):
+            try:
+                httpx.get(base_url + "/api/poller")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            sys.exit("app did not start")
+
+        cpu_start, ticks_start = proc_cpu_seconds(app.pid), treasury.index
+        latencies, stats = asyncio.run(run_clients(args, app_port, treasury))
+        cpu_end, ticks = proc_cpu_seconds(app.pid), treasury.index - ticks_start
+        metrics = parse_metrics(httpx.get(base_url + "/metrics").text)
+        rss = proc_rss_mb(app.pid)
+    finally:
+        app.terminate()
+        app.wait()
+        for server in fakes:
+            server.should_exit = True
+
+    ms = [x * 1000 for x in latencies]
+    print(f"clients: {args.clients} fast + {args.slow} slow, {stats['connected']} connected, {args.rate:g} ticks/s for {args.duration:g}s")
+    print(f"ticks: {ticks} upstream, {len(ms)} tick deliveries, {stats['messages']} messages received")
+    print(f"tick-to-client ms: p50 {percentile(ms, 50):.1f}  p90 {percentile(ms, 90):.1f}  p99 {percentile(ms, 99):.1f}  max {max(ms, default=float('nan')):.1f}")
+    if cpu_start is not None and ticks:
+        print(f"cpu: {cpu_end - cpu_start:.2f}s total, {(cpu_end - cpu_start) / ticks * 1000:.2f} ms per tick")
+    if rss is not None:
+        print(f"memory: {rss:.1f} MB RSS")
+    sent = sum(v for k, v in metrics.items() if k.startswith("ws_sent_bytes_total"))
+    print(f"bytes sent: {sent / 1024:.1f} KB, slow clients dropped: {metrics.get('ws_dropped_clients_total', 0):g}")
+    if args.max_p99 and percentile(ms, 99) > args.max_p99:
+        sys.exit(f"p99 {percentile(ms, 99):.1f} ms exceeds {args.max_p99:g} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import json
+import sys
+import time
+import zlib
+
+from main import HISTORY_WINDOW, WIRE_FORMATS, Tick, msgpack
+
+
+def build_payloads():
+    rows = []
+    last_buy = None
+    for i in range(HISTORY_WINDOW):
+        buy = 1500000 + (i * 7919) % 20000
+        status = "➖" if last_buy is None else ("🚀" if buy > last_buy else "🔻" if buy < last_buy else "➖")
+        rows.append(Tick(buy, buy - 50000, status, f"2025-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}").row)
+        last_buy = buy
+    usd_idr = [{"price": f"15,{600 + i}.5000", "time": f"10:00:{i:02d}"} for i in range(11)]
+    snapshot = {
+        "type": "snapshot",
+        "seq": 1,
+        "history": rows,
+        "history_window": HISTORY_WINDOW,
+        "usd_idr_history": usd_idr,
+        "treasury_info": "Belum ada info treasury.",
+    }
+    delta = {"type": "delta", "seq": 2, "history": {"append": rows[-1:], "evict": 1}}
+    return {"snapshot": snapshot, "delta": delta}
+
+
+def bench(fn, payload, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn(payload)
+    return (time.perf_counter() - start) / number * 1000
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    encoders = {"stdlib json": json.dumps}
+    encoders.update(WIRE_FORMATS)
+    if msgpack is None:
+        del encoders["msgpack"]
+        print("msgpack not installed, skipping it")
+
+    for name, payload in build_payloads().items():
+        print(f"{name}:")
+        print(f"  {'format':<12} {'encode ms':>10} {'bytes':>9} {'deflated':>9}")
+        for fmt, fn in encoders.items():
+            data = fn(payload)
+            if isinstance(data, str):
+                data = data.encode()
+            print(f"  {fmt:<12} {bench(fn, payload, number):10.3f} {len(data):9d} {len(zlib.compress(data)):9d}")
+
+
+if __name__ == "__main__":
+    main()
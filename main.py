@@ -1,147 +1,2191 @@
+import time
+
+# Taken before the other imports so the startup report includes import time.
+STARTUP_BEGAN = time.perf_counter()
+
 import asyncio
-import json
+import bisect
+import gzip
+import hashlib
+import math
+import operator
 import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
 from datetime import datetime, timedelta
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from html import escape
+from statistics import median
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
 import httpx
-from bs4 import BeautifulSoup
+import orjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Imported on first use by ProfitEngine.
+np = None
+
+last_buy = None
+active_connections = {}
+usd_idr_history = []
+usd_idr_total = 0
+snapshot_cache = None
+
+HISTORY_WINDOW = int(os.environ.get("HISTORY_WINDOW", "1441"))
+TREASURY_API_URL = os.environ.get("TREASURY_API_URL", "https://api.treasury.id/api/v1/antigrvty/gold/rate")
+POLL_MIN_INTERVAL = float(os.environ.get("POLL_MIN_INTERVAL", "0.05"))
+POLL_MAX_INTERVAL = float(os.environ.get("POLL_MAX_INTERVAL", "2"))
+POLL_MAX_BACKOFF = float(os.environ.get("POLL_MAX_BACKOFF", "30"))
+POLL_HEDGE = int(os.environ.get("POLL_HEDGE", "1"))
+INGEST_DEDUP_WINDOW = int(os.environ.get("INGEST_DEDUP_WINDOW", "5000"))
+INGEST_MAX_LATE = float(os.environ.get("INGEST_MAX_LATE", "3600"))
+INGEST_RESET_AFTER = int(os.environ.get("INGEST_RESET_AFTER", "3"))
+TICK_STORE_PATH = os.environ.get("TICK_STORE_PATH", "ticks.db")
+TICK_STORE_RETENTION_DAYS = float(os.environ.get("TICK_STORE_RETENTION_DAYS", "30"))
+TICK_STORE_LOAD_TIMEOUT = float(os.environ.get("TICK_STORE_LOAD_TIMEOUT", "3"))
+CANDLE_TIMEFRAMES = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+CANDLE_LIMIT = int(os.environ.get("CANDLE_LIMIT", "1000"))
+CANDLE_WARM_HOURS = float(os.environ.get("CANDLE_WARM_HOURS", "24"))
+WIB_OFFSET = 7 * 3600
+HISTORY_PAGE_MAX = int(os.environ.get("HISTORY_PAGE_MAX", "5000"))
+HISTORY_QUERY_MAX = int(os.environ.get("HISTORY_QUERY_MAX", "200000"))
+FX_PARSERS = os.environ.get("FX_PARSERS", "regex,lxml,bs4").split(",")
+FX_PARSE_POOL = os.environ.get("FX_PARSE_POOL", "thread")
+FX_URL = os.environ.get("FX_URL", "https://www.google.com/finance/quote/USD-IDR")
+FX_YAHOO_URL = os.environ.get("FX_YAHOO_URL", "https://query1.finance.yahoo.com/v8/finance/chart/USDIDR=X")
+FX_ERAPI_URL = os.environ.get("FX_ERAPI_URL", "https://open.er-api.com/v6/latest/USD")
+FX_SOURCES = os.environ.get("FX_SOURCES", "google,yahoo,erapi").split(",")
+FX_SOURCE_TIMEOUT = float(os.environ.get("FX_SOURCE_TIMEOUT", "3"))
+FX_MAX_INTERVAL = float(os.environ.get("FX_MAX_INTERVAL", "30"))
+FX_MAX_DEVIATION = float(os.environ.get("FX_MAX_DEVIATION", "0.02"))
+FX_STALE_AFTER = float(os.environ.get("FX_STALE_AFTER", "120"))
+FX_LOOP_INTERVAL = float(os.environ.get("FX_LOOP_INTERVAL", "1"))
+FX_MAX_BYTES = int(os.environ.get("FX_MAX_BYTES", "2000000"))
+FX_BREAKER_THRESHOLD = int(os.environ.get("FX_BREAKER_THRESHOLD", "5"))
+FX_BREAKER_COOLDOWN = float(os.environ.get("FX_BREAKER_COOLDOWN", "30"))
+FX_BREAKER_MAX_COOLDOWN = float(os.environ.get("FX_BREAKER_MAX_COOLDOWN", "600"))
+WS_SEND_QUEUE = int(os.environ.get("WS_SEND_QUEUE", "4"))
+WS_SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", "10"))
+WS_PING_INTERVAL = float(os.environ.get("WS_PING_INTERVAL", "30"))
+POLL_TIMEOUT = float(os.environ.get("POLL_TIMEOUT", "25"))
+POLL_BACKLOG = int(os.environ.get("POLL_BACKLOG", "256"))
+INGEST_MODE = os.environ.get("INGEST_MODE", "auto" if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1 else "local")
+INGEST_LOCK_PATH = os.environ.get("INGEST_LOCK_PATH", "/tmp/monitor-emas-ingest.lock")
+INGEST_SOCKET_PATH = os.environ.get("INGEST_SOCKET_PATH", "/tmp/monitor-emas-ingest.sock")
+INGEST_MAX_BUFFER = int(os.environ.get("INGEST_MAX_BUFFER", "4000000"))
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+INDEX_PRERENDER_ROWS = int(os.environ.get("INDEX_PRERENDER_ROWS", "4"))
+WS_DEFLATE = os.environ.get("WS_DEFLATE", "true").lower() in ("1", "true")
+# Investment scenarios as name:modal:pokok, where pokok is either the cost basis in
+# rupiah or a percentage cost taken off the modal (e.g. jt5:5000000:3.4%).
+PROFIT_SCENARIOS_SPEC = os.environ.get(
+    "PROFIT_SCENARIOS",
+    "jt5:5000000:3.4%,jt10:10000000:3.4%,jt20:20000000:19315000,jt30:30000000:28980000,"
+    "jt50:50000000:3.4%,jt100:100000000:3.4%,jt500:500000000:3.4%,jt1000:1000000000:3.4%"
+)
+PROFIT_DISPLAY = ("jt20", "jt30")
+STATS_WINDOW = int(os.environ.get("STATS_WINDOW", "60"))
+STATS_RATE_WINDOW = float(os.environ.get("STATS_RATE_WINDOW", "60"))
+TROY_OUNCE_GRAMS = 31.1034768
+ALERT_MAX_PER_CHAT = int(os.environ.get("ALERT_MAX_PER_CHAT", "20"))
+ALERT_SEND_RATE = float(os.environ.get("ALERT_SEND_RATE", "25"))
+ALERT_CHAT_INTERVAL = float(os.environ.get("ALERT_CHAT_INTERVAL", "1"))
+ALERT_MAX_MOVE_WINDOW = float(os.environ.get("ALERT_MAX_MOVE_WINDOW", "1440"))
+
+treasury_info = "Belum ada info treasury."
+
+# Last state sent to clients. Snapshots and deltas are built from this copy so that
+# a snapshot always matches its seq number exactly.
+published = {
+    "seq": 0,
+    "history": deque(maxlen=HISTORY_WINDOW),
+    "profit": deque(maxlen=HISTORY_WINDOW),
+    "history_total": 0,
+    "usd_idr_history": deque(maxlen=11),
+    "usd_idr_total": 0,
+    "treasury_info": treasury_info,
+}
+SEND_SNAPSHOT = object()
+CLOSE = object()
+
+telegram_app = None
+background_tasks = []
+
+
+class ChangeFeed:
+    # Versioned replacement for shared asyncio.Events: publishers bump a per-channel
+    # version, waiters block until the overall version passes the one they last saw.
+    # Nothing is ever cleared, so no waiter can swallow another waiter's wake-up.
+
+    def __init__(self, *channels):
+        self.version = 0
+        self.versions = dict.fromkeys(channels, 0)
+        self._changed = None
+
+    def publish(self, channel):
+        self.versions[channel] += 1
+        self.version += 1
+        if self._changed is not None:
+            self._changed.set_result(None)
+            self._changed = None
+
+    async def wait(self, since):
+        while self.version <= since:
+            if self._changed is None:
+                self._changed = asyncio.get_running_loop().create_future()
+            # shield: a cancelled waiter must not cancel the future shared by the others
+            await asyncio.shield(self._changed)
+        return self.version
+
+
+change_feed = ChangeFeed("gold", "fx", "info")
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    # Minimal Prometheus-style metrics: label tuples map to plain floats, so an
+    # update is a dict lookup and an add, cheap enough for every tick and send.
+    registry = []
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        Metric.registry.append(self)
+
+    def label_text(self, values, extra=""):
+        pairs = [f'{k}="{v}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{self.label_text(k)} {v}" for k, v in self.values.items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), func=None):
+        super().__init__(name, help, labels)
+        self.func = func
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def render(self):
+        if self.func is not None:
+            return [f"{self.name} {self.func()}"]
+        return [f"{self.name}{self.label_text(k)} {v}" for k, v in self.values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = []
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self.label_text(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self.label_text(labels)} {total}")
+            lines.append(f"{self.name}_count{self.label_text(labels)} {count}")
+        return lines
+
+
+def render_metrics():
+    lines = []
+    for metric in Metric.registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+UPSTREAM_SECONDS = Histogram("upstream_request_seconds", "Upstream request latency", ("source",))
+UPSTREAM_RESPONSES = Counter("upstream_responses_total", "Upstream responses by status", ("source", "status"))
+INGEST_TO_BROADCAST_SECONDS = Histogram("ingest_to_broadcast_seconds", "Delay from tick ingest to broadcast")
+ENCODE_SECONDS = Histogram("message_encode_seconds", "Broadcast message encode time", ("format",))
+WS_SEND_SECONDS = Histogram("ws_send_seconds", "Per-client WebSocket send latency", ("format",))
+WS_SENT_BYTES = Counter("ws_sent_bytes_total", "Bytes sent to WebSocket clients", ("format",))
+WS_SENT_MESSAGES = Counter("ws_sent_messages_total", "Messages sent to WebSocket clients", ("format",))
+WS_DROPPED = Counter("ws_dropped_clients_total", "Clients dropped for being too slow")
+WS_CLIENTS = Gauge("ws_clients", "Connected /ws and /sse clients", func=lambda: len(active_connections))
+LOOP_LAG_SECONDS = Histogram("event_loop_lag_seconds", "Event loop scheduling lag")
+TELEGRAM_SECONDS = Histogram("telegram_handler_seconds", "Telegram command handler latency", ("command",))
+FX_SOURCE_HEALTH = Gauge("fx_source_health", "Health score (0-1) of each USD/IDR source", ("source",))
+FX_CONSENSUS = Gauge("fx_consensus", "Median USD/IDR across fresh sources")
+INGEST_TICKS = Counter("ingest_payloads_total", "Treasury payloads by ingest stage and outcome", ("stage", "outcome"))
+STARTUP_SECONDS = Gauge("startup_stage_seconds", "Duration of each startup stage", ("stage",))
+ALERT_CHECK_SECONDS = Histogram("alert_check_seconds", "Time to match one tick against alert rules")
+ALERTS_TRIGGERED = Counter("alerts_triggered_total", "Alert rules triggered")
+ALERTS_SENT = Counter("alert_messages_total", "Alert messages sent to Telegram", ("status",))
+
+
+def format_rupiah(nominal):
+    try:
+        return "{:,}".format(int(nominal)).replace(",", ".")
+    except:
+        return str(nominal)
+
+
+def parse_price_to_float(price_str):
+    try:
+        return float(price_str.replace('.', '').replace(',', '.'))
+    except:
+        return None
+
+
+def parse_fx_price(price_str):
+    # Google Finance renders USD/IDR as 15,618.5000; accept 15.618,5000 as well.
+    if price_str.rfind(",") > price_str.rfind("."):
+        price_str = price_str.replace(".", "").replace(",", ".")
+    else:
+        price_str = price_str.replace(",", "")
+    try:
+        return float(price_str)
+    except ValueError:
+        return None
+
+
+def format_profit(val):
+    if val > 0:
+        return f"+{format_rupiah(val)} 🟢"
+    elif val < 0:
+        return f"-{format_rupiah(abs(val))} 🔴"
+    else:
+        return "0 ➖"
+
+
+def parse_profit_scenarios(spec):
+    scenarios = {}
+    for item in spec.split(","):
+        name, modal, cost = item.strip().split(":")
+        modal = float(modal)
+        if cost.endswith("%"):
+            pokok = modal * (1 - float(cost[:-1]) / 100)
+        else:
+            pokok = float(cost)
+        scenarios[name] = (modal, pokok)
+    return scenarios
+
+
+PROFIT_SCENARIOS = parse_profit_scenarios(PROFIT_SCENARIOS_SPEC)
+
+
+def format_row(h):
+    row = {
+        "buying_rate": format_rupiah(h.buying_rate),
+        "selling_rate": format_rupiah(h.selling_rate),
+        "status": h.status,
+        "created_at": h.created_at,
+    }
+    # The profit columns are filled in by ProfitEngine.update, which computes every
+    # scenario for a batch of ticks at once.
+    for name in PROFIT_DISPLAY:
+        row[name] = "-"
+    return row
+
+
+class Tick:
+    __slots__ = ("buying_rate", "selling_rate", "status", "created_at", "ts", "row", "live", "profit")
+
+    def __init__(self, buying_rate, selling_rate, status, created_at, ts=None, live=False):
+        self.buying_rate = buying_rate
+        self.selling_rate = selling_rate
+        self.status = status
+        self.created_at = created_at
+        self.ts = time.time() if ts is None else ts
+        # Only ticks that just came off the wire count towards ingest_to_broadcast_seconds;
+        # ones reloaded from the store or replayed in a sync are hours old.
+        self.live = live
+        # Display strings are formatted once here and reused by every snapshot/delta.
+        self.row = format_row(self)
+        # One value per PROFIT_SCENARIOS entry, set by ProfitEngine.update.
+        self.profit = None
+
+
+class TickRing:
+    # Fixed-capacity ring of Ticks. `total` counts every tick ever appended, so
+    # `since(n)` can hand out exactly the ticks a reader has not seen yet.
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self._items = [None] * capacity
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def __bool__(self):
+        return self.total > 0
+
+    def append(self, tick):
+        self._items[self.total % self.capacity] = tick
+        self.total += 1
+
+    def __getitem__(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("tick index out of range")
+        return self._items[(self.total - size + index) % self.capacity]
+
+    def since(self, total):
+        start = max(total, self.total - len(self))
+        return [self._items[i % self.capacity] for i in range(start, self.total)]
+
+    def __iter__(self):
+        return iter(self.since(0))
+
+
+history = TickRing(HISTORY_WINDOW)
+
+
+class ProfitEngine:
+    # Profit of every scenario for every tick in the history window, kept as a
+    # ring of NumPy rows aligned with `history.total`. Ticks that arrived since the
+    # last update are evaluated together as one (ticks x scenarios) array.
+
+    def __init__(self, scenarios, capacity):
+        self.config = scenarios
+        self.names = list(scenarios)
+        self.display = [(name, self.names.index(name)) for name in PROFIT_DISPLAY if name in scenarios]
+        self.capacity = capacity
+        self.total = 0
+        self.modal = self.pokok = self.values = None
+
+    @property
+    def ready(self):
+        return self.values is not None
+
+    def load(self):
+        # Imports NumPy and allocates the ring. The ingest and follower paths call
+        # this from a worker thread so the import never lands on the event loop;
+        # readers check `ready` instead of triggering it.
+        global np
+        if self.values is None:
+            import numpy as np
+            self.modal = np.array([modal for modal, pokok in self.config.values()])
+            self.pokok = np.array([pokok for modal, pokok in self.config.values()])
+            self.values = np.zeros((self.capacity, len(self.names)), dtype=np.int64)
+
+    def compute(self, buying_rates, selling_rates):
+        self.load()
+        buying = np.asarray(buying_rates, dtype=np.float64)[:, None]
+        selling = np.asarray(selling_rates, dtype=np.float64)[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = (self.modal / buying) * selling - self.pokok
+        values[~np.isfinite(values)] = 0
+        # astype truncates toward zero, like int().
+        return values.astype(np.int64)
+
+    def update(self, ring):
+        self.load()
+        ticks = ring.since(self.total)
+        if ticks:
+            batch = self.compute([t.buying_rate for t in ticks], [t.selling_rate for t in ticks])
+            self.values[np.arange(ring.total - len(ticks), ring.total) % self.capacity] = batch
+            # The same results feed the table columns, alerts and snapshot/delta blocks.
+            for tick, values in zip(ticks, batch.tolist()):
+                tick.profit = values
+                if tick.buying_rate and tick.selling_rate:
+                    for name, i in self.display:
+                        tick.row[name] = format_profit(values[i])
+        self.total = ring.total
+
+    def window(self, limit, end=None):
+        # Rows for the `limit` ticks before `end` (a history.total value), oldest first.
+        self.load()
+        end = self.total if end is None else end
+        n = max(0, min(limit, end - max(0, self.total - self.capacity)))
+        return self.values[np.arange(end - n, end) % self.capacity]
+
+    def scenarios(self):
+        return [{"name": name, "modal": int(modal), "pokok": int(pokok)} for name, (modal, pokok) in self.config.items()]
+
+
+profit_engine = ProfitEngine(PROFIT_SCENARIOS, HISTORY_WINDOW)
+
+
+class TickStore:
+    # Append-only SQLite (WAL) log of gold ticks and USD/IDR points. The ingest
+    # loops only put rows on a queue; a background thread writes them in batches
+    # and periodically drops rows older than the retention window.
+
+    def __init__(self, path, retention_days, compact_interval=3600):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.compact_interval = compact_interval
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        # auto_vacuum only takes effect before the first table exists (or after a
+        # VACUUM), and must be set before the switch to WAL, so not via _connect().
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS gold (id INTEGER PRIMARY KEY, ts REAL, created_at TEXT,"
+            " buying_rate INTEGER, selling_rate INTEGER, status TEXT)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS fx (id INTEGER PRIMARY KEY, ts REAL, price TEXT, time TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS gold_ts ON gold (ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS fx_ts ON fx (ts)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS alerts (id INTEGER PRIMARY KEY, chat_id INTEGER, field TEXT,"
+            " op TEXT, threshold REAL, window REAL)"
+        )
+        conn.commit()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # A file created without incremental auto_vacuum: convert it once so
+            # _compact can hand freed pages back to the filesystem.
+            print("Converting tick store to incremental auto_vacuum")
+            conn.execute("VACUUM")
+        conn.close()
+        self.thread = threading.Thread(target=self._run, name="tick-store", daemon=True)
+        self.thread.start()
+
+    def _put(self, kind, row):
+        # Without a writer thread (start() failed) nothing would ever drain the queue.
+        if self.thread is not None:
+            self.queue.put((kind, row))
+
+    def append_gold(self, tick):
+        self._put("gold", (tick.ts, tick.created_at, tick.buying_rate, tick.selling_rate, tick.status))
+
+    def append_fx(self, row, ts):
+        self._put("fx", (ts, row["price"], row["time"]))
+
+    def append_alert(self, rule):
+        self._put("alert", (rule.id, rule.chat_id, rule.field, rule.op, rule.threshold, rule.window))
+
+    def delete_alert(self, rule_id):
+        self._put("alert_delete", (rule_id,))
+
+    def load_alerts(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT id, chat_id, field, op, threshold, window FROM alerts ORDER BY id").fetchall()
+        finally:
+            conn.close()
+
+    def load_gold(self, limit, since=None):
+        # Last `limit` ticks, or everything since `since` if that reaches further back.
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT buying_rate, selling_rate, status, created_at, ts FROM gold"
+                " WHERE id >= (SELECT MIN(id) FROM (SELECT id FROM gold ORDER BY id DESC LIMIT ?)) OR ts >= ?"
+                " ORDER BY id",
+                (limit, time.time() if since is None else since)
+            ).fetchall()
+        finally:
+            conn.close()
+        return rows
+
+    def query_gold(self, start, end, after, limit):
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT ts, created_at, buying_rate, selling_rate, status FROM gold"
+                " WHERE ts >= ? AND ts <= ? AND ts > ? ORDER BY ts LIMIT ?",
+                (start, end, after, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def load_fx(self, limit):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT price, time FROM fx ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [{"price": price, "time": t} for price, t in rows[::-1]]
+
+    def _run(self):
+        conn = self._connect()
+        next_compact = time.monotonic() + self.compact_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=self.compact_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            batch = [item] if item else []
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(conn, batch)
+                    conn.close()
+                    return
+                batch.append(item)
+            self._write(conn, batch)
+            if time.monotonic() >= next_compact:
+                self._compact(conn)
+                next_compact = time.monotonic() + self.compact_interval
+        conn.close()
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO gold (ts, created_at, buying_rate, selling_rate, status) VALUES (?, ?, ?, ?, ?)",
+                    [row for table, row in batch if table == "gold"]
+                )
+                conn.executemany(
+                    "INSERT INTO fx (ts, price, time) VALUES (?, ?, ?)",
+                    [row for table, row in batch if table == "fx"]
+                )
+                for table, row in batch:
+                    if table == "alert":
+                        conn.execute("INSERT OR REPLACE INTO alerts VALUES (?, ?, ?, ?, ?, ?)", row)
+                    elif table == "alert_delete":
+                        conn.execute("DELETE FROM alerts WHERE id = ?", row)
+        except Exception as e:
+            print(f"Error writing tick store: {e}")
+
+    def _compact(self, conn):
+        try:
+            cutoff = time.time() - self.retention
+            with conn:
+                conn.execute("DELETE FROM gold WHERE ts < ?", (cutoff,))
+                conn.execute("DELETE FROM fx WHERE ts < ?", (cutoff,))
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            print(f"Error compacting tick store: {e}")
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+            self.thread = None
+
+
+tick_store = TickStore(TICK_STORE_PATH, TICK_STORE_RETENTION_DAYS) if TICK_STORE_PATH else None
+
+
+class Candle:
+    __slots__ = ("start", "buy", "sell", "spread", "count")
+
+    def __init__(self, start, buying_rate, selling_rate):
+        spread = buying_rate - selling_rate
+        self.start = start
+        self.buy = [buying_rate] * 4
+        self.sell = [selling_rate] * 4
+        self.spread = [spread] * 4
+        self.count = 1
+
+    def update(self, buying_rate, selling_rate):
+        for ohlc, value in ((self.buy, buying_rate), (self.sell, selling_rate), (self.spread, buying_rate - selling_rate)):
+            if value > ohlc[1]:
+                ohlc[1] = value
+            if value < ohlc[2]:
+                ohlc[2] = value
+            ohlc[3] = value
+        self.count += 1
+
+    def to_dict(self):
+        return {"t": int(self.start), "buy": self.buy, "sell": self.sell, "spread": self.spread, "n": self.count}
+
+    def to_row(self):
+        return [self.start, self.buy, self.sell, self.spread, self.count]
+
+    @classmethod
+    def from_row(cls, row):
+        candle = cls.__new__(cls)
+        candle.start, candle.buy, candle.sell, candle.spread, candle.count = row
+        return candle
+
+
+class CandleEngine:
+    # Incremental OHLC for buy, sell and spread. Each tick touches only the last
+    # candle of every timeframe; buckets are aligned to WIB so 1d starts at midnight.
+
+    def __init__(self, timeframes, limit):
+        self.timeframes = timeframes
+        self.series = {name: deque(maxlen=limit) for name in timeframes}
+        self.version = 0
+        self._messages = {}
+
+    def add(self, ts, buying_rate, selling_rate):
+        for name, seconds in self.timeframes.items():
+            start = ts - (ts + WIB_OFFSET) % seconds
+            series = self.series[name]
+            if series and series[-1].start == start:
+                series[-1].update(buying_rate, selling_rate)
+            elif not series or start > series[-1].start:
+                series.append(Candle(start, buying_rate, selling_rate))
+        self.version += 1
+
+    def dump(self):
+        return {name: [c.to_row() for c in series] for name, series in self.series.items()}
+
+    def load(self, dumped):
+        # Replace every series with another worker's, e.g. the ingester's warmed candles.
+        for name, rows in dumped.items():
+            if name in self.series:
+                self.series[name].clear()
+                self.series[name].extend(Candle.from_row(row) for row in rows)
+        self.version += 1
+
+    def get(self, name, limit):
+        series = self.series[name]
+        return [c.to_dict() for c in list(series)[-limit:]]
+
+    def update_message(self, name):
+        # Last two candles, so a client also sees the final state of a candle that just closed.
+        cached = self._messages.get(name)
+        if cached is None or cached[0] != self.version:
+            cached = (self.version, encode_json({"type": "update", "tf": name, "candles": self.get(name, 2)}))
+            self._messages[name] = cached
+        return cached[1]
+
+
+candles = CandleEngine(CANDLE_TIMEFRAMES, CANDLE_LIMIT)
+
+
+class MonotonicWindow:
+    # Rolling max (with operator.gt) or min (operator.lt) of the last `size`
+    # values. Every value enters and leaves the deque once, so add() is O(1) amortized.
+
+    def __init__(self, size, keeps):
+        self.size = size
+        self.keeps = keeps
+        self.items = deque()
+        self.count = 0
+
+    def add(self, value):
+        while self.items and not self.keeps(self.items[-1][1], value):
+            self.items.pop()
+        self.items.append((self.count, value))
+        self.count += 1
+        if self.items[0][0] < self.count - self.size:
+            self.items.popleft()
+
+    def value(self):
+        return self.items[0][1] if self.items else None
+
+
+class RollingStats:
+    # Live indicators over the last `window` gold ticks, updated per tick from
+    # running sums and deques: nothing here ever rescans history.
+
+    def __init__(self, window, rate_window):
+        self.window = window
+        self.rate_window = rate_window
+        self.alpha = 2 / (window + 1)
+        self.prices = deque()
+        self.price_sum = 0.0
+        self.ema = None
+        self.returns = deque()
+        self.return_sum = 0.0
+        self.return_sq = 0.0
+        self.high = MonotonicWindow(window, operator.gt)
+        self.low = MonotonicWindow(window, operator.lt)
+        self.spreads = deque()
+        self.sorted_spreads = []
+        self.tick_times = deque()
+        self.last_buy = None
+        self.spread = None
+        self.usd_idr = None
+
+    def add_gold(self, ts, buying_rate, selling_rate):
+        if buying_rate <= 0:
+            return
+        self.prices.append(buying_rate)
+        self.price_sum += buying_rate
+        if len(self.prices) > self.window:
+            self.price_sum -= self.prices.popleft()
+        self.ema = buying_rate if self.ema is None else self.ema + self.alpha * (buying_rate - self.ema)
+
+        if self.last_buy:
+            r = math.log(buying_rate / self.last_buy)
+            self.returns.append(r)
+            self.return_sum += r
+            self.return_sq += r * r
+            if len(self.returns) > self.window:
+                old = self.returns.popleft()
+                self.return_sum -= old
+                self.return_sq -= old * old
+        self.last_buy = buying_rate
+        self.high.add(buying_rate)
+        self.low.add(buying_rate)
+
+        # Spread percentile needs order statistics: a sorted copy of the window,
+        # kept with bisect (O(log n) search plus a short memmove).
+        self.spread = buying_rate - selling_rate
+        self.spreads.append(self.spread)
+        bisect.insort(self.sorted_spreads, self.spread)
+        if len(self.spreads) > self.window:
+            del self.sorted_spreads[bisect.bisect_left(self.sorted_spreads, self.spreads.popleft())]
+
+        self.tick_times.append(ts)
+        self._trim_rate(ts)
+
+    def add_fx(self, price):
+        self.usd_idr = price
+
+    def _trim_rate(self, now):
+        while self.tick_times and self.tick_times[0] < now - self.rate_window:
+            self.tick_times.popleft()
+
+    def summary(self):
+        self._trim_rate(time.time())
+        n = len(self.prices)
+        k = len(self.returns)
+        volatility = None
+        if k > 1:
+            variance = (self.return_sq - self.return_sum * self.return_sum / k) / (k - 1)
+            volatility = round(math.sqrt(max(0.0, variance)) * 100, 4)
+        xau_usd = None
+        if self.last_buy and self.usd_idr:
+            xau_usd = round(self.last_buy * TROY_OUNCE_GRAMS / self.usd_idr, 2)
+        return {
+            "window": self.window,
+            "ticks": n,
+            "sma": round(self.price_sum / n, 2) if n else None,
+            "ema": round(self.ema, 2) if self.ema is not None else None,
+            "volatility": volatility,
+            "high": self.high.value(),
+            "low": self.low.value(),
+            "spread": self.spread,
+            "spread_percentile": round(
+                bisect.bisect_right(self.sorted_spreads, self.spread) / len(self.sorted_spreads) * 100, 1
+            ) if self.sorted_spreads else None,
+            "tick_rate": round(len(self.tick_times) * 60 / self.rate_window, 2),
+            "usd_idr": self.usd_idr,
+            "xau_usd": xau_usd,
+        }
+
+
+rolling_stats = RollingStats(STATS_WINDOW, STATS_RATE_WINDOW)
+
+
+HISTORY_FIELDS = {
+    "buy": lambda r: r[2],
+    "sell": lambda r: r[3],
+    "spread": lambda r: r[2] - r[3],
+}
+
+
+def downsample_lttb(rows, points, value):
+    # Largest-Triangle-Three-Buckets over (ts, value); keeps first and last row.
+    if points >= len(rows) or points < 3:
+        return rows
+    sampled = [rows[0]]
+    bucket = (len(rows) - 2) / (points - 2)
+    a = 0
+    for i in range(points - 2):
+        lo = int(i * bucket) + 1
+        hi = int((i + 1) * bucket) + 1
+        nxt_hi = min(int((i + 2) * bucket) + 1, len(rows))
+        nxt = rows[hi:nxt_hi] or [rows[-1]]
+        avg_t = sum(r[0] for r in nxt) / len(nxt)
+        avg_v = sum(value(r) for r in nxt) / len(nxt)
+        at, av = rows[a][0], value(rows[a])
+        best, best_area = lo, -1
+        for j in range(lo, hi):
+            area = abs((at - avg_t) * (value(rows[j]) - av) - (at - rows[j][0]) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(rows[best])
+        a = best
+    sampled.append(rows[-1])
+    return sampled
+
+
+def downsample_minmax(rows, points, value):
+    # Min and max of each bucket, in time order, so spikes survive downsampling.
+    buckets = max(1, points // 2)
+    if len(rows) <= points:
+        return rows
+    size = len(rows) / buckets
+    sampled = []
+    for i in range(buckets):
+        bucket = rows[int(i * size):int((i + 1) * size)]
+        if not bucket:
+            continue
+        lo = min(bucket, key=value)
+        hi = max(bucket, key=value)
+        sampled.extend(sorted({id(lo): lo, id(hi): hi}.values(), key=lambda r: r[0]))
+    return sampled
+
+
+DOWNSAMPLERS = {"lttb": downsample_lttb, "minmax": downsample_minmax}
+
+
+def query_history(start, end, after, limit):
+    rows = []
+    for tick in history:
+        if tick.ts > after and start <= tick.ts <= end:
+            rows.append((tick.ts, tick.created_at, tick.buying_rate, tick.selling_rate, tick.status))
+            if len(rows) >= limit:
+                break
+    return rows
+
+
+def to_columns(rows):
+    if not rows:
+        return {"columns": [], "values": []}
+    columns = list(rows[0])
+    return {"columns": columns, "values": [[row[c] for row in rows] for c in columns]}
+
+
+def to_columnar(payload):
+    # Row lists become parallel arrays so keys are not repeated on every row.
+    payload = dict(payload)
+    for key in ("history", "usd_idr_history"):
+        value = payload.get(key)
+        if isinstance(value, list):
+            payload[key] = to_columns(value)
+        elif isinstance(value, dict):
+            payload[key] = dict(value, append=to_columns(value["append"]))
+    return payload
+
+
+def encode_json(payload):
+    return orjson.dumps(payload).decode()
+
+
+def encode_columnar(payload):
+    return orjson.dumps(to_columnar(payload)).decode()
+
+
+def encode_msgpack(payload):
+    return msgpack.packb(to_columnar(payload))
+
+
+WIRE_FORMATS = {
+    "json": encode_json,
+    "columnar": encode_columnar,
+    "msgpack": encode_msgpack if msgpack else encode_columnar,
+}
+# Formats usable over text-only transports (/sse, /poll).
+TEXT_FORMATS = ("json", "columnar")
+
+
+class Message:
+    # One broadcast payload, encoded at most once per wire format and shared by
+    # every client that asked for that format.
+    __slots__ = ("payload", "encoded")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.encoded = {}
+
+    def encode(self, fmt):
+        entry = self.encoded.get(fmt)
+        if entry is None:
+            start = time.perf_counter()
+            data = WIRE_FORMATS[fmt](self.payload)
+            ENCODE_SECONDS.observe(time.perf_counter() - start, fmt)
+            size = len(data) if isinstance(data, bytes) else len(data.encode())
+            entry = self.encoded[fmt] = (data, size)
+        return entry
+
+    def sse(self, fmt):
+        # The SSE frame is cached next to the encodings, so /sse clients share it too.
+        key = "sse-" + fmt
+        frame = self.encoded.get(key)
+        if frame is None:
+            frame = self.encoded[key] = f"id: {self.payload['seq']}\ndata: {self.encode(fmt)[0]}\n\n".encode()
+        return frame
+
+
+def current_snapshot():
+    global snapshot_cache
+    if snapshot_cache is None or snapshot_cache[0] != published["seq"]:
+        snapshot_cache = (published["seq"], Message({
+            "type": "snapshot",
+            "seq": published["seq"],
+            "history": list(published["history"]),
+            "history_window": HISTORY_WINDOW,
+            "usd_idr_history": list(published["usd_idr_history"]),
+            "treasury_info": published["treasury_info"],
+            # One column per scenario, aligned with "history".
+            "profit": {
+                "scenarios": profit_engine.names,
+                "values": [list(column) for column in zip(*published["profit"])] or [[] for _ in profit_engine.names]
+            },
+            "stats": rolling_stats.summary()
+        }))
+    return snapshot_cache[1]
+
+
+def enqueue(queue, message):
+    if queue.full():
+        # Slow client: drop the backlog and let it catch up from a fresh snapshot.
+        while not queue.empty():
+            queue.get_nowait()
+        if message is not CLOSE:
+            message = SEND_SNAPSHOT
+    queue.put_nowait(message)
+
+
+def publish_delta(changed):
+    delta = {}
+
+    if "gold" in changed and history.total > published["history_total"]:
+        ticks = history.since(published["history_total"])
+        now = time.time()
+        for tick in ticks:
+            if tick.live:
+                INGEST_TO_BROADCAST_SECONDS.observe(now - tick.ts)
+        rows = [tick.row for tick in ticks]
+        profit = [tick.profit or [None] * len(profit_engine.names) for tick in ticks]
+        before = len(published["history"])
+        published["history"].extend(rows)
+        published["profit"].extend(profit)
+        published["history_total"] = history.total
+        delta["history"] = {
+            "append": rows,
+            "evict": before + len(rows) - len(published["history"])
+        }
+        # Scenario values of the appended rows, one column per scenario; evicted with "history".
+        delta["profit"] = {"values": [list(column) for column in zip(*profit)]}
+
+    new_prices = usd_idr_total - published["usd_idr_total"]
+    if "fx" in changed and new_prices > 0:
+        rows = usd_idr_history[-min(new_prices, len(usd_idr_history)):]
+        before = len(published["usd_idr_history"])
+        published["usd_idr_history"].extend(rows)
+        published["usd_idr_total"] = usd_idr_total
+        delta["usd_idr_history"] = {
+            "append": rows,
+            "evict": before + len(rows) - len(published["usd_idr_history"])
+        }
+
+    if "info" in changed and treasury_info != published["treasury_info"]:
+        published["treasury_info"] = treasury_info
+        delta["treasury_info"] = treasury_info
+
+    if not delta:
+        return None
+    if "history" in delta or "usd_idr_history" in delta:
+        delta["stats"] = rolling_stats.summary()
+    published["seq"] += 1
+    delta["type"] = "delta"
+    delta["seq"] = published["seq"]
+    return Message(delta)
+
+
+# Recent deltas in seq order, so /poll can catch a client up without a snapshot.
+recent_deltas = deque(maxlen=POLL_BACKLOG)
+delivery_feed = ChangeFeed("delta")
+
+
+def messages_since(since):
+    seq = published["seq"]
+    if since is not None and since <= seq:
+        if since == seq:
+            return []
+        if recent_deltas and recent_deltas[0].payload["seq"] <= since + 1:
+            return [m for m in recent_deltas if m.payload["seq"] > since]
+    return [current_snapshot()]
+
+
+async def broadcast_loop():
+    version = change_feed.version
+    seen = dict(change_feed.versions)
+
+    while True:
+        try:
+            try:
+                async with asyncio.timeout(WS_PING_INTERVAL):
+                    version = await change_feed.wait(version)
+            except TimeoutError:
+                message = Message({"type": "ping", "seq": published["seq"]})
+            else:
+                changed = {ch for ch, v in change_feed.versions.items() if v != seen[ch]}
+                seen.update(change_feed.versions)
+                message = publish_delta(changed)
+                if message is None:
+                    continue
+                recent_deltas.append(message)
+                delivery_feed.publish("delta")
+
+            for queue in active_connections.values():
+                enqueue(queue, message)
+
+        except Exception as e:
+            print(f"Error broadcast_loop: {e}")
+            await asyncio.sleep(0.2)
+
+
+# Class order and extra classes vary between page builds; match on both classes.
+FX_PRICE_SELECTOR = "div.YMlKec.fxKbKc"
+FX_PRICE_RE = re.compile(r'<div[^>]*class="YMlKec fxKbKc"[^>]*>([^<]+)</div>')
+FX_PRICE_XPATH = (
+    '//div[contains(concat(" ", normalize-space(@class), " "), " YMlKec ")'
+    ' and contains(concat(" ", normalize-space(@class), " "), " fxKbKc ")]'
+)
+
+
+def extract_price_regex(text):
+    match = FX_PRICE_RE.search(text)
+    if match:
+        return match.group(1).strip()
+    return None
+
+
+def extract_price_lxml(text):
+    from lxml import html as lxml_html
+    nodes = lxml_html.fromstring(text).xpath(FX_PRICE_XPATH)
+    if nodes:
+        return nodes[0].text_content().strip()
+    return None
+
+
+def extract_price_bs4(text):
+    from bs4 import BeautifulSoup
+    price_div = BeautifulSoup(text, "html.parser").select_one(FX_PRICE_SELECTOR)
+    if price_div:
+        return price_div.text.strip()
+    return None
+
+
+FX_EXTRACTORS = {
+    "regex": extract_price_regex,
+    "lxml": extract_price_lxml,
+    "bs4": extract_price_bs4,
+}
+
+
+def extract_usd_idr_price(content, encoding="utf-8"):
+    # Runs in fx_executor. Tries the cheap targeted parsers first and only falls
+    # back to a full BeautifulSoup parse when the markup no longer matches.
+    text = content.decode(encoding or "utf-8", errors="replace")
+    for name in FX_PARSERS:
+        try:
+            price = FX_EXTRACTORS[name](text)
+        except Exception as e:
+            print(f"Error extracting USD/IDR with {name}: {e}")
+            price = None
+        if price:
+            return price
+    return None
+
+
+if FX_PARSE_POOL == "process":
+    fx_executor = ProcessPoolExecutor(max_workers=1)
+else:
+    fx_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fx-parse")
+
+
+FX_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9,id;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache",
+    "Sec-Ch-Ua": '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+    "Sec-Ch-Ua-Mobile": "?0",
+    "Sec-Ch-Ua-Platform": '"Windows"',
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Sec-Fetch-User": "?1",
+    "Upgrade-Insecure-Requests": "1",
+}
+FX_COOKIES = {
+    "CONSENT": "YES+cb.20231208-04-p0.en+FX+410",
+    "SOCS": "CAISHAgCEhJnd3NfMjAyMzEyMDgtMF9SQzEaAmVuIAEaBgiA_LmqBg",
+}
+
+
+def format_fx_price(value):
+    # Same shape as the Google Finance text, so rows look alike whatever the source.
+    return f"{value:,.4f}"
+
+
+def extract_yahoo_price(content, encoding="utf-8"):
+    return format_fx_price(float(orjson.loads(content)["chart"]["result"][0]["meta"]["regularMarketPrice"]))
+
+
+def extract_erapi_price(content, encoding="utf-8"):
+    return format_fx_price(float(orjson.loads(content)["rates"]["IDR"]))
+
+
+class FxClient:
+    # Long-lived client for one FX source: a pooled HTTP/2 connection and cookie
+    # jar, conditional GETs, a cap on bytes read per page and a circuit breaker
+    # that pauses fetching after repeated failures. It also keeps the source's
+    # health score and adaptive polling interval for FxAggregator.
+
+    def __init__(self, name, url, extract, max_bytes, breaker_threshold, breaker_cooldown,
+                 interval=1, live=True, offload=False, cookies=None):
+        self.name = name
+        self.url = url
+        self.extract = extract
+        self.max_bytes = max_bytes
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.base_interval = interval
+        self.interval = interval
+        self.live = live
+        self.offload = offload
+        self.cookies = cookies
+        self.client = None
+        self.etag = None
+        self.last_modified = None
+        self.last_price = None
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0
+        self.health = 1.0
+        self.latency = None
+        self.value = None
+        self.updated = None
+        self.next_due = 0
+
+    def _get_client(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=10,
+                follow_redirects=True,
+                headers=FX_HEADERS,
+                cookies=self.cookies,
+                limits=httpx.Limits(max_keepalive_connections=2, max_connections=4),
+                http2=True
+            )
+        return self.client
+
+    def due(self, now):
+        return now >= self.next_due and now >= self.open_until
+
+    def fresh(self, now):
+        return self.updated is not None and now - self.updated <= FX_STALE_AFTER
+
+    async def fetch(self):
+        if time.monotonic() < self.open_until:
+            return None
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        start = time.monotonic()
+        try:
+            async with self._get_client().stream("GET", self.url, headers=headers) as response:
+                self.latency = time.monotonic() - start
+                UPSTREAM_SECONDS.observe(self.latency, f"fx-{self.name}")
+                UPSTREAM_RESPONSES.inc(f"fx-{self.name}", response.status_code)
+                if response.status_code == 304 and self.last_price:
+                    self._succeeded()
+                    return self.last_price
+                response.raise_for_status()
+                content = bytearray()
+                async for chunk in response.aiter_bytes():
+                    content += chunk
+                    if len(content) >= self.max_bytes:
+                        break
+                encoding = response.charset_encoding
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+
+            if self.offload:
+                price = await asyncio.get_running_loop().run_in_executor(
+                    fx_executor, self.extract, bytes(content), encoding
+                )
+            else:
+                price = self.extract(bytes(content), encoding)
+            if not price:
+                raise ValueError("price element not found")
+        except Exception as e:
+            self._failed(e)
+            return None
+
+        self.etag = etag
+        self.last_modified = last_modified
+        self.last_price = price
+        self._succeeded()
+        return price
+
+    def _succeeded(self):
+        if self.trips:
+            print(f"USD/IDR fetch from {self.name} recovered")
+        self.failures = 0
+        self.trips = 0
+        self.health = 0.8 * self.health + 0.2
+        self.updated = time.monotonic()
+
+    def _failed(self, error):
+        self.failures += 1
+        self.health *= 0.8
+        if self.failures == 1:
+            print(f"Error fetching USD/IDR from {self.name}: {error}")
+        if self.failures >= self.breaker_threshold:
+            cooldown = min(FX_BREAKER_MAX_COOLDOWN, self.breaker_cooldown * 2 ** min(self.trips, 20))
+            self.trips += 1
+            self.failures = 0
+            self.open_until = time.monotonic() + cooldown
+            print(f"USD/IDR fetch from {self.name} suspended for {cooldown:.0f}s after repeated failures: {error}")
+
+    def reject(self):
+        # A price too far from the consensus counts against health but not the breaker.
+        self.health *= 0.6
+        self.value = None
+
+    def schedule(self, ok):
+        # Back off only while the source fails or gets rejected. A quiet market is
+        # no reason to poll less: the next move should still show within one interval.
+        if ok:
+            self.interval = self.base_interval
+        else:
+            self.interval = min(max(FX_MAX_INTERVAL, self.base_interval), self.interval * 1.5)
+        self.next_due = time.monotonic() + self.interval / max(self.health, 0.25)
+        FX_SOURCE_HEALTH.set(self.health, self.name)
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "live": self.live,
+            "health": round(self.health, 3),
+            "interval": round(self.interval, 2),
+            "latency": round(self.latency, 4) if self.latency is not None else None,
+            "price": self.last_price,
+            "age": round(now - self.updated, 1) if self.updated is not None else None,
+            "suspended": now < self.open_until,
+        }
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+class FxAggregator:
+    # Polls every due source concurrently, each under its own timeout. One source
+    # at a time is shown, and its price goes out as soon as it answers; the median
+    # of all fresh sources is kept as the consensus. Sources quote slightly
+    # different prices, so the shown source only changes when it goes stale or is
+    # rejected, and reference (non-live) sources only when no live source is fresh.
+
+    def __init__(self, sources, timeout, max_deviation):
+        self.sources = sources
+        self.timeout = timeout
+        self.max_deviation = max_deviation
+        self.consensus = None
+        self.display = None
+
+    def _preferred(self, now):
+        current = self.display
+        fresh = [s for s in self.sources if s.value is not None and s.fresh(now)]
+        live = [s for s in fresh if s.live]
+        if current in fresh and (current.live or not live):
+            return current
+        pool = live or fresh
+        # Ties keep FX_SOURCES order, so the first configured source is preferred.
+        return max(pool, key=lambda s: s.health) if pool else None
+
+    async def _fetch(self, source):
+        previous = source.last_price
+        try:
+            async with asyncio.timeout(self.timeout):
+                price = await source.fetch()
+        except TimeoutError:
+            source._failed(TimeoutError(f"no answer within {self.timeout:g}s"))
+            price = None
+        return source, price, previous
+
+    async def poll(self, show):
+        now = time.monotonic()
+        due = [source for source in self.sources if source.due(now)]
+        shown = None
+        for result in asyncio.as_completed([self._fetch(source) for source in due]):
+            source, price, previous = await result
+            value = parse_fx_price(price) if price else None
+            # Only outvote a source when at least two other fresh sources agree on a
+            # reference; checking against a stale or self-derived consensus would
+            # lock out every source once the market has moved during an outage.
+            others = [s.value for s in self.sources if s is not source and s.value is not None and s.fresh(now)]
+            if value is not None and len(others) >= 2:
+                reference = median(others)
+                if abs(value / reference - 1) > self.max_deviation:
+                    print(f"USD/IDR from {source.name} rejected: {price} vs consensus {reference:,.4f}")
+                    source.reject()
+                    value = None
+            source.schedule(value is not None)
+            if value is None:
+                continue
+            source.value = value
+            display = self._preferred(time.monotonic())
+            if display is source and (price != previous or display is not self.display):
+                if display is not self.display:
+                    print(f"USD/IDR now shown from {source.name}")
+                    self.display = display
+                shown = price
+                show(price)
+
+        values = [s.value for s in self.sources if s.value is not None and s.fresh(time.monotonic())]
+        if not values:
+            self.consensus = None
+        else:
+            consensus = median(values)
+            if consensus != self.consensus:
+                self.consensus = consensus
+                FX_CONSENSUS.set(consensus)
+                set_fx_consensus(consensus)
+                replicator.send({"t": "fxc", "value": consensus})
+        return shown
+
+    def status(self):
+        return {
+            "consensus": self.consensus,
+            "display": self.display.name if self.display else None,
+            "sources": [source.status() for source in self.sources],
+        }
+
+    async def aclose(self):
+        for source in self.sources:
+            await source.aclose()
+
+
+FX_SOURCE_DEFS = {
+    "google": lambda: FxClient(
+        "google", FX_URL, extract_usd_idr_price, FX_MAX_BYTES, FX_BREAKER_THRESHOLD, FX_BREAKER_COOLDOWN,
+        interval=1, offload=True, cookies=FX_COOKIES
+    ),
+    "yahoo": lambda: FxClient(
+        "yahoo", FX_YAHOO_URL, extract_yahoo_price, FX_MAX_BYTES, FX_BREAKER_THRESHOLD, FX_BREAKER_COOLDOWN,
+        interval=2
+    ),
+    # Daily reference rate: only feeds the consensus unless every live source is down.
+    "erapi": lambda: FxClient(
+        "erapi", FX_ERAPI_URL, extract_erapi_price, FX_MAX_BYTES, FX_BREAKER_THRESHOLD, FX_BREAKER_COOLDOWN,
+        interval=300, live=False
+    ),
+}
+fx_aggregator = FxAggregator(
+    [FX_SOURCE_DEFS[name]() for name in FX_SOURCES if name in FX_SOURCE_DEFS], FX_SOURCE_TIMEOUT, FX_MAX_DEVIATION
+)
+
+
+class PollScheduler:
+    # Paces the treasury poller. The interval snaps to the floor when a new
+    # updated_at shows up and then relaxes towards a ceiling derived from the
+    # observed gap between upstream changes for the current hour of day (WIB).
+    # Errors and 429s back off exponentially with full jitter.
+
+    def __init__(self, min_interval, max_interval, max_backoff, hedge):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.interval = min_interval
+        self.hour_gaps = [None] * 24
+        self.errors = 0
+        self.retry_after = 0
+        self.sent = 0
+        self.applied = 0
+        self.polls = 0
+        self.wasted = 0
+        self.changes = 0
+        self.failures = 0
+        self.last_change_at = None
+        self.last_stale_sent = None
+        self.last_change_sent = None
+        self.poll_times = deque(maxlen=1000)
+        self.detect_delays = deque(maxlen=1000)
+
+    def begin(self):
+        now = time.monotonic()
+        self.sent += 1
+        self.polls += 1
+        self.poll_times.append(now)
+        return self.sent, now
+
+    def accept(self, seq):
+        # With hedged requests a slow, older response must not overwrite a newer one.
+        if seq < self.applied:
+            return False
+        self.applied = seq
+        return True
+
+    def ceiling(self):
+        gap = self.hour_gaps[(datetime.utcnow() + timedelta(hours=7)).hour]
+        if gap is None:
+            return self.min_interval
+        return min(self.max_interval, max(self.min_interval, gap / 4))
+
+    def on_result(self, sent_at, changed):
+        now = time.monotonic()
+        self.errors = 0
+        self.retry_after = 0
+        if not changed:
+            self.wasted += 1
+            if self.last_stale_sent is None or sent_at > self.last_stale_sent:
+                self.last_stale_sent = sent_at
+            self.interval = min(self.interval * 1.1, self.ceiling())
+            return
+
+        self.changes += 1
+        # The change happened after the latest earlier poll that already saw the
+        # previous state, stale or changed, and before this one was sent.
+        lower = max(
+            (t for t in (self.last_stale_sent, self.last_change_sent) if t is not None and t < sent_at), default=None
+        )
+        if lower is not None:
+            self.detect_delays.append(now - (lower + sent_at) / 2)
+        if self.last_change_sent is None or sent_at > self.last_change_sent:
+            self.last_change_sent = sent_at
+        if self.last_change_at is not None:
+            hour = (datetime.utcnow() + timedelta(hours=7)).hour
+            gap = now - self.last_change_at
+            prev = self.hour_gaps[hour]
+            self.hour_gaps[hour] = gap if prev is None else prev * 0.8 + gap * 0.2
+        self.last_change_at = now
+        self.interval = self.min_interval
+
+    def on_error(self, retry_after=0):
+        self.errors += 1
+        self.failures += 1
+        self.retry_after = retry_after
+
+    def next_delay(self):
+        if not self.errors:
+            return self.interval
+        # Cap the exponent: after a long outage 2 ** errors no longer fits in a float.
+        backoff = min(self.max_backoff, self.min_interval * 2 ** min(self.errors, 20))
+        return max(self.retry_after, random.uniform(self.min_interval, max(self.min_interval, backoff)))
+
+    def stats(self):
+        rate = 0.0
+        if len(self.poll_times) > 1:
+            span = self.poll_times[-1] - self.poll_times[0]
+            if span > 0:
+                rate = (len(self.poll_times) - 1) / span
+        delays = sorted(self.detect_delays)
+
+        def pct(p):
+            if not delays:
+                return None
+            return round(delays[min(len(delays) - 1, int(len(delays) * p))] * 1000, 1)
+
+        return {
+            "poll_rate": round(rate, 2),
+            "interval_ms": round(self.interval * 1000, 1),
+            "hedge": self.hedge,
+            "polls": self.polls,
+            "changes": self.changes,
+            "wasted_polls": self.wasted,
+            "failures": self.failures,
+            "detect_p50_ms": pct(0.5),
+            "detect_p99_ms": pct(0.99),
+        }
+
+
+poll_scheduler = PollScheduler(POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, POLL_MAX_BACKOFF, POLL_HEDGE)
+
+
+def parse_retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except ValueError:
+        return 0
 
-history = []
-last_buy = None
-active_connections = set()
-usd_idr_history = []
 
-update_event = asyncio.Event()
-usd_idr_update_event = asyncio.Event()
+def add_gold_tick(tick):
+    global last_buy
+    history.append(tick)
+    profit_engine.update(history)
+    rolling_stats.add_gold(tick.ts, tick.buying_rate, tick.selling_rate)
+    candles.add(tick.ts, tick.buying_rate, tick.selling_rate)
+    last_buy = tick.buying_rate
+    change_feed.publish("gold")
 
-treasury_info = "Belum ada info treasury."
-treasury_info_update_event = asyncio.Event()
 
-telegram_app = None
+def add_usd_idr(row):
+    global usd_idr_total
+    usd_idr_history.append(row)
+    usd_idr_history[:] = usd_idr_history[-11:]
+    usd_idr_total += 1
+    change_feed.publish("fx")
 
 
-def format_rupiah(nominal):
-    try:
-        return "{:,}".format(int(nominal)).replace(",", ".")
-    except:
-        return str(nominal)
+def set_fx_consensus(value):
+    rolling_stats.add_fx(value)
 
 
-def parse_price_to_float(price_str):
+def set_treasury_info(text):
+    global treasury_info
+    treasury_info = text
+    change_feed.publish("info")
+
+
+def parse_updated_at(text):
     try:
-        return float(price_str.replace('.', '').replace(',', '.'))
-    except:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
         return None
 
 
-async def fetch_usd_idr_price():
-    url = "https://www.google.com/finance/quote/USD-IDR"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9,id;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Cache-Control": "no-cache",
-        "Pragma": "no-cache",
-        "Sec-Ch-Ua": '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-        "Sec-Ch-Ua-Mobile": "?0",
-        "Sec-Ch-Ua-Platform": '"Windows"',
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "none",
-        "Sec-Fetch-User": "?1",
-        "Upgrade-Insecure-Requests": "1",
-    }
-    cookies = {
-        "CONSENT": "YES+cb.20231208-04-p0.en+FX+410",
-        "SOCS": "CAISHAgCEhJnd3NfMjAyMzEyMDgtMF9SQzEaAmVuIAEaBgiA_LmqBg",
-    }
+class TickPipeline:
+    # Treasury payload -> admitted tick, as separate stages that each take plain
+    # values, so recorded payloads can be replayed through them one by one:
+    # decode -> validate -> dedup -> order -> admit. Publishing stays with the caller.
+    #
+    # Dedup remembers the last `dedup_size` admitted updated_at values in admission
+    # order. Since admission is time-ordered, anything that falls out of the window
+    # is also older than the newest tick and gets stopped as late instead.
+    #
+    # A backwards jump beyond `max_late` is only taken as an upstream clock reset
+    # once `reset_after` distinct payloads in a row continue the new timeline; a
+    # single stale or cached response is rejected like any other late tick.
+
+    def __init__(self, dedup_size, max_late, reset_after=3):
+        self.dedup_size = dedup_size
+        self.max_late = max_late
+        self.reset_after = reset_after
+        self.seen = set()
+        self.seen_order = deque()
+        self.last_time = None
+        self.reset_streak = []
+        self.counts = {}
+
+    def count(self, stage, outcome):
+        key = f"{stage}.{outcome}"
+        self.counts[key] = self.counts.get(key, 0) + 1
+        INGEST_TICKS.inc(stage, outcome)
+
+    def decode(self, content):
+        try:
+            payload = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            self.count("decode", "error")
+            return None
+        self.count("decode", "ok")
+        return payload
+
+    def validate(self, payload):
+        data = payload.get("data") if isinstance(payload, dict) else None
+        try:
+            buying_rate = int(data["buying_rate"])
+            selling_rate = int(data["selling_rate"])
+            updated_at = data["updated_at"]
+        except (KeyError, TypeError, ValueError):
+            self.count("validate", "invalid")
+            return None
+        if buying_rate <= 0 or selling_rate <= 0 or not updated_at or not isinstance(updated_at, str):
+            self.count("validate", "invalid")
+            return None
+        self.count("validate", "ok")
+        return buying_rate, selling_rate, updated_at
+
+    def dedup(self, updated_at):
+        if updated_at in self.seen:
+            self.count("dedup", "duplicate")
+            return False
+        self.count("dedup", "new")
+        return True
+
+    def order(self, at):
+        # Unparseable timestamps keep arrival order.
+        if at is None or self.last_time is None or at >= self.last_time:
+            self.reset_streak.clear()
+            self.count("order", "ok")
+            return True
+        if self.last_time - at <= self.max_late:
+            self.count("order", "late")
+            return False
+        if self.reset_streak and at > self.reset_streak[-1]:
+            self.reset_streak.append(at)
+        else:
+            self.reset_streak = [at]
+        if len(self.reset_streak) < self.reset_after:
+            self.count("order", "stale")
+            return False
+        self.count("order", "reset")
+        self.reset_streak.clear()
+        self.last_time = None
+        return True
+
+    def admit(self, updated_at, at):
+        self.seen.add(updated_at)
+        self.seen_order.append(updated_at)
+        if len(self.seen_order) > self.dedup_size:
+            self.seen.discard(self.seen_order.popleft())
+        if at is not None:
+            self.last_time = at
+
+    def process(self, content):
+        payload = self.decode(content)
+        if payload is None:
+            return None
+        fields = self.validate(payload)
+        if fields is None or not self.dedup(fields[2]):
+            return None
+        at = parse_updated_at(fields[2])
+        if not self.order(at):
+            return None
+        self.admit(fields[2], at)
+        return fields
+
+    def seed(self, ticks):
+        for tick in ticks:
+            self.admit(tick.created_at, parse_updated_at(tick.created_at))
+
+
+ingest_pipeline = TickPipeline(INGEST_DEDUP_WINDOW, INGEST_MAX_LATE, INGEST_RESET_AFTER)
+
+
+async def poll_gold_rate(client):
+    seq, sent_at = poll_scheduler.begin()
     try:
-        async with httpx.AsyncClient(timeout=10, follow_redirects=True, cookies=cookies) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            price_div = soup.find("div", class_="YMlKec fxKbKc")
-            if price_div:
-                return price_div.text.strip()
+        try:
+            response = await client.post(TREASURY_API_URL)
+        finally:
+            UPSTREAM_SECONDS.observe(time.monotonic() - sent_at, "treasury")
+        UPSTREAM_RESPONSES.inc("treasury", response.status_code)
+        if response.status_code != 200:
+            poll_scheduler.on_error(parse_retry_after(response) if response.status_code == 429 else 0)
+            return
+        if not poll_scheduler.accept(seq):
+            return
+
+        fields = ingest_pipeline.process(response.content)
+        changed = fields is not None
+        if changed:
+            buying_rate, selling_rate, updated_at = fields
+            status = "➖"
+            if last_buy is not None:
+                if buying_rate > last_buy:
+                    status = "🚀"
+                elif buying_rate < last_buy:
+                    status = "🔻"
+
+            tick = Tick(buying_rate, selling_rate, status, updated_at, live=True)
+            add_gold_tick(tick)
+            if tick_store:
+                tick_store.append_gold(tick)
+            replicator.send_gold(tick)
+            for chat_id, text in alert_engine.check(tick):
+                alert_sender.push(chat_id, text)
+            ingest_pipeline.count("publish", "ok")
+
+        poll_scheduler.on_result(sent_at, changed)
+
     except Exception as e:
-        print(f"Error fetching USD/IDR: {e}")
-    return None
+        print(f"Error api_loop: {e}")
+        UPSTREAM_RESPONSES.inc("treasury", "error")
+        poll_scheduler.on_error()
 
 
 async def api_loop():
-    global last_buy, history
-    api_url = "https://api.treasury.id/api/v1/antigrvty/gold/rate"
-    shown_updates = set()
+    ingest_pipeline.seed(history)
+    slots = asyncio.Semaphore(POLL_HEDGE)
+    in_flight = set()
+
+    def done(task):
+        in_flight.discard(task)
+        slots.release()
 
     async with httpx.AsyncClient(
         timeout=3,
         limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
         http2=True
     ) as client:
-        while True:
-            try:
-                response = await client.post(api_url)
-                if response.status_code == 200:
-                    data = response.json().get("data", {})
-                    buying_rate = int(data.get("buying_rate", 0))
-                    selling_rate = int(data.get("selling_rate", 0))
-                    updated_at = data.get("updated_at")
-                    
-                    if updated_at and updated_at not in shown_updates:
-                        status = "➖"
-                        if last_buy is not None:
-                            if buying_rate > last_buy:
-                                status = "🚀"
-                            elif buying_rate < last_buy:
-                                status = "🔻"
-                        
-                        row = {
-                            "buying_rate": buying_rate,
-                            "selling_rate": selling_rate,
-                            "status": status,
-                            "created_at": updated_at
-                        }
-                        history.append(row)
-                        history[:] = history[-1441:]
-                        last_buy = buying_rate
-                        shown_updates.add(updated_at)
-
-                        if len(shown_updates) > 5000:
-                            shown_updates.clear()
-                            shown_updates.add(updated_at)
-
-                        update_event.set()
-
-                await asyncio.sleep(0.05)
+        try:
+            while True:
+                # Up to POLL_HEDGE requests stay in flight, started one interval apart.
+                await slots.acquire()
+                task = asyncio.create_task(poll_gold_rate(client))
+                in_flight.add(task)
+                task.add_done_callback(done)
+                try:
+                    delay = poll_scheduler.next_delay()
+                except Exception as e:
+                    print(f"Error api_loop: {e}")
+                    delay = POLL_MAX_BACKOFF
+                await asyncio.sleep(delay)
+        finally:
+            for task in list(in_flight):
+                task.cancel()
 
-            except Exception as e:
-                print(f"Error api_loop: {e}")
-                await asyncio.sleep(0.2)
+
+def show_usd_idr(price_str):
+    if parse_price_to_float(price_str) is None:
+        return
+    if not usd_idr_history or usd_idr_history[-1]["price"] != price_str:
+        wib_now = datetime.utcnow() + timedelta(hours=7)
+        row = {
+            "price": price_str,
+            "time": wib_now.strftime("%H:%M:%S")
+        }
+        add_usd_idr(row)
+        if tick_store:
+            tick_store.append_fx(row, time.time())
+        replicator.send({"t": "fx", "row": row})
+
+
+def ingest_status():
+    return {"fx": fx_aggregator.status(), "poller": dict(poll_scheduler.stats(), pipeline=ingest_pipeline.counts)}
 
 
 async def usd_idr_loop():
-    global usd_idr_history
     while True:
+        started = time.monotonic()
         try:
-            price_str = await fetch_usd_idr_price()
-            if price_str:
-                price_float = parse_price_to_float(price_str)
-                if price_float is not None:
-                    if not usd_idr_history or usd_idr_history[-1]["price"] != price_str:
-                        wib_now = datetime.utcnow() + timedelta(hours=7)
-                        usd_idr_history.append({
-                            "price": price_str,
-                            "time": wib_now.strftime("%H:%M:%S")
-                        })
-                        usd_idr_history[:] = usd_idr_history[-11:]
-                        usd_idr_update_event.set()
-            await asyncio.sleep(1)
+            await fx_aggregator.poll(show_usd_idr)
         except Exception as e:
             print(f"Error usd_idr_loop: {e}")
-            await asyncio.sleep(1)
+        # Followers never poll, so /api/fx and /api/poller there serve this copy.
+        if replicator.followers:
+            replicator.send({"t": "status", **ingest_status()})
+        await asyncio.sleep(max(0.1, FX_LOOP_INTERVAL - (time.monotonic() - started)))
+
+
+class Replicator:
+    # Ingester side of INGEST_MODE=auto: streams every tick, FX point and info change
+    # to the other workers as newline-delimited JSON over a Unix socket.
+
+    def __init__(self, path, max_buffer):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.server = None
+        self.followers = set()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._follower_connected, path=self.path)
+
+    async def _follower_connected(self, reader, writer):
+        writer.write(orjson.dumps({
+            "t": "sync",
+            "gold": [[t.buying_rate, t.selling_rate, t.status, t.created_at, t.ts] for t in history],
+            "fx": usd_idr_history,
+            "info": treasury_info,
+            "candles": candles.dump(),
+            "status": ingest_status(),
+        }) + b"\n")
+        self.followers.add(writer)
+        try:
+            await reader.read()
+        finally:
+            self.followers.discard(writer)
+            writer.close()
+
+    def send(self, event):
+        if not self.followers:
+            return
+        line = orjson.dumps(event) + b"\n"
+        for writer in list(self.followers):
+            # A worker that stops reading gets cut off; it reconnects and resyncs.
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                self.followers.discard(writer)
+                writer.close()
+            else:
+                writer.write(line)
+
+    def send_gold(self, tick):
+        self.send({"t": "gold", "tick": [tick.buying_rate, tick.selling_rate, tick.status, tick.created_at, tick.ts]})
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.followers):
+                writer.close()
+            self.followers.clear()
+
+
+replicator = Replicator(INGEST_SOCKET_PATH, INGEST_MAX_BUFFER)
+ingest_lock = None
+
+
+def acquire_ingest_lock():
+    global ingest_lock
+    if fcntl is None:
+        return True
+    fd = os.open(INGEST_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    ingest_lock = fd
+    return True
+
+
+def apply_replicated(event):
+    kind = event["t"]
+    if kind == "gold":
+        add_gold_tick(Tick(*event["tick"], live=True))
+    elif kind == "fx":
+        add_usd_idr(event["row"])
+    elif kind == "info":
+        set_treasury_info(event["text"])
+    elif kind == "fxc":
+        set_fx_consensus(event["value"])
+    elif kind == "status":
+        set_ingest_status(event)
+    elif kind == "sync":
+        # Only take what is newer than what this worker already holds, so a
+        # reconnect never duplicates rows.
+        last_ts = history[-1].ts if history else 0
+        for row in event["gold"]:
+            if row[4] > last_ts:
+                add_gold_tick(Tick(*row))
+        # The ingester's candles reach back CANDLE_WARM_HOURS, further than the
+        # synced history, so take them as-is instead of rebuilding from ticks.
+        candles.load(event["candles"])
+        fx = event["fx"]
+        if usd_idr_history and usd_idr_history[-1] in fx:
+            fx = fx[fx.index(usd_idr_history[-1]) + 1:]
+        for row in fx:
+            add_usd_idr(row)
+        if event["info"] != treasury_info:
+            set_treasury_info(event["info"])
+        set_ingest_status(event["status"])
+
+
+# The ingester's /api/fx and /api/poller answers, as last replicated; None on the ingester.
+replicated_status = None
+
+
+def set_ingest_status(status):
+    global replicated_status
+    replicated_status = {"fx": status["fx"], "poller": status["poller"]}
+
+
+async def follower_loop():
+    # Worker side: mirror the ingester, and take over ingest if its lock frees up.
+    # Replicated ticks go through ProfitEngine, so load NumPy off the loop first.
+    global replicated_status
+    await asyncio.to_thread(profit_engine.load)
+    while True:
+        if acquire_ingest_lock():
+            print("Ingest lock acquired, this worker is now the ingester")
+            replicated_status = None
+            await start_ingest()
+            return
+        try:
+            reader, writer = await asyncio.open_unix_connection(INGEST_SOCKET_PATH, limit=2 ** 24)
+            try:
+                while line := await reader.readline():
+                    apply_replicated(orjson.loads(line))
+            finally:
+                writer.close()
+        except (ConnectionError, FileNotFoundError):
+            pass
+        except Exception as e:
+            print(f"Error follower_loop: {e}")
+        await asyncio.sleep(1)
+
+
+ALERT_FIELDS = {"beli": "Harga beli", "jual": "Harga jual", "cuan20": "Est. cuan 20 JT", "cuan30": "Est. cuan 30 JT"}
+ALERT_COALESCE = 10
+ALERT_USAGE = (
+    "Gunakan:\n"
+    "/alert beli < 1500000\n"
+    "/alert jual > 1600000\n"
+    "/alert cuan20 > 0\n"
+    "/alert gerak 0.5 10  (gerak > 0,5% dalam 10 menit)\n"
+    "/daftar untuk melihat alert, /hapus <id|semua> untuk menghapus"
+)
+
+
+def alert_amount(value):
+    return f"-{format_rupiah(-value)}" if value < 0 else format_rupiah(value)
+
+
+def alert_values(tick):
+    values = {"beli": tick.buying_rate, "jual": tick.selling_rate}
+    if tick.buying_rate and tick.profit is not None:
+        for field, scenario in (("cuan20", "jt20"), ("cuan30", "jt30")):
+            if scenario in PROFIT_SCENARIOS:
+                values[field] = tick.profit[profit_engine.names.index(scenario)]
+    return values
+
+
+class AlertRule:
+    __slots__ = ("id", "chat_id", "field", "op", "threshold", "window")
+
+    def __init__(self, id, chat_id, field, op, threshold, window=0):
+        self.id = id
+        self.chat_id = chat_id
+        self.field = field
+        self.op = op
+        self.threshold = threshold
+        self.window = window
+
+    def describe(self):
+        if self.field == "gerak":
+            return f"Gerak harga > {self.threshold:g}% dalam {self.window:g} menit"
+        return f"{ALERT_FIELDS[self.field]} {self.op} {alert_amount(self.threshold)}"
+
+
+class ThresholdIndex:
+    # Rules for one field kept sorted by threshold, one list per direction. A tick
+    # that moves the value from prev to value fires exactly the thresholds it
+    # crossed, found with two bisects instead of a scan over every rule.
+
+    def __init__(self):
+        self.keys = {">": [], "<": []}
+        self.rules = {">": [], "<": []}
+
+    def __len__(self):
+        return len(self.rules[">"]) + len(self.rules["<"])
+
+    def add(self, rule):
+        keys = self.keys[rule.op]
+        i = bisect.bisect_right(keys, rule.threshold)
+        keys.insert(i, rule.threshold)
+        self.rules[rule.op].insert(i, rule)
+
+    def remove(self, rule):
+        keys, rules = self.keys[rule.op], self.rules[rule.op]
+        i = bisect.bisect_left(keys, rule.threshold)
+        while rules[i] is not rule:
+            i += 1
+        del keys[i], rules[i]
+
+    def crossed(self, prev, value):
+        if value > prev:
+            keys = self.keys[">"]
+            return self.rules[">"][bisect.bisect_left(keys, prev):bisect.bisect_left(keys, value)]
+        if value < prev:
+            keys = self.keys["<"]
+            return self.rules["<"][bisect.bisect_right(keys, value):bisect.bisect_right(keys, prev)]
+        return []
+
+
+class AlertEngine:
+    # Price alerts for Telegram chats. Threshold rules fire when a tick crosses
+    # them; "gerak" rules fire when the move over their window crosses the percentage.
+
+    def __init__(self):
+        self.rules = {}
+        self.by_chat = {}
+        self.indexes = {field: ThresholdIndex() for field in ALERT_FIELDS}
+        self.moves = {}
+        self.last_values = {}
+        self.last_moves = {}
+        self.recent_ts = []
+        self.recent_buy = []
+        self.next_id = 1
+
+    def load(self, rows):
+        for row in rows:
+            self._insert(AlertRule(*row))
+        if self.rules:
+            self.next_id = max(self.rules) + 1
+        print(f"Loaded {len(self.rules)} alerts")
+
+    def _index(self, rule):
+        if rule.field == "gerak":
+            return self.moves.setdefault(rule.window, ThresholdIndex())
+        return self.indexes[rule.field]
+
+    def _insert(self, rule):
+        self.rules[rule.id] = rule
+        self.by_chat.setdefault(rule.chat_id, {})[rule.id] = rule
+        self._index(rule).add(rule)
+
+    def add(self, chat_id, field, op, threshold, window=0):
+        if len(self.by_chat.get(chat_id, ())) >= ALERT_MAX_PER_CHAT:
+            return None
+        rule = AlertRule(self.next_id, chat_id, field, op, threshold, window)
+        self.next_id += 1
+        self._insert(rule)
+        if tick_store:
+            tick_store.append_alert(rule)
+        return rule
+
+    def remove(self, chat_id, rule_id):
+        rule = self.by_chat.get(chat_id, {}).pop(rule_id, None)
+        if rule is None:
+            return False
+        del self.rules[rule_id]
+        index = self._index(rule)
+        index.remove(rule)
+        if rule.field == "gerak" and not index:
+            del self.moves[rule.window]
+            self.last_moves.pop(rule.window, None)
+        if tick_store:
+            tick_store.delete_alert(rule_id)
+        return True
+
+    def list(self, chat_id):
+        return list(self.by_chat.get(chat_id, {}).values())
+
+    def check(self, tick):
+        start = time.perf_counter()
+        hits = []
+        for field, value in alert_values(tick).items():
+            prev = self.last_values.get(field)
+            self.last_values[field] = value
+            if prev is not None:
+                for rule in self.indexes[field].crossed(prev, value):
+                    hits.append((rule.chat_id, f"🔔 {rule.describe()}\nSekarang: {alert_amount(value)}"))
+
+        if self.moves:
+            buy = tick.buying_rate
+            self.recent_ts.append(tick.ts)
+            self.recent_buy.append(buy)
+            cut = bisect.bisect_left(self.recent_ts, tick.ts - max(self.moves) * 60)
+            if cut:
+                del self.recent_ts[:cut], self.recent_buy[:cut]
+            for window, index in self.moves.items():
+                ref = self.recent_buy[bisect.bisect_left(self.recent_ts, tick.ts - window * 60)]
+                change = (buy - ref) / ref * 100
+                prev = self.last_moves.get(window, 0.0)
+                self.last_moves[window] = abs(change)
+                for rule in index.crossed(prev, abs(change)):
+                    hits.append((rule.chat_id, f"🔔 {rule.describe()}\nHarga beli {format_rupiah(buy)} ({change:+.2f}%)"))
+        elif self.recent_ts:
+            self.recent_ts.clear()
+            self.recent_buy.clear()
+
+        ALERT_CHECK_SECONDS.observe(time.perf_counter() - start)
+        if hits:
+            ALERTS_TRIGGERED.inc(amount=len(hits))
+        return hits
+
+
+def parse_alert(args):
+    try:
+        if len(args) == 3 and args[0] == "gerak":
+            percent, minutes = float(args[1].replace(",", ".")), float(args[2])
+            if percent > 0 and 0 < minutes <= ALERT_MAX_MOVE_WINDOW:
+                return "gerak", ">", percent, minutes
+        elif len(args) == 3 and args[0] in ALERT_FIELDS and args[1] in ("<", ">"):
+            return args[0], args[1], int(args[2].replace(".", "")), 0
+    except ValueError:
+        pass
+    return None
+
+
+class AlertSender:
+    # Outgoing alert queue that stays under Telegram's limits: at most `rate`
+    # messages per second overall and one per `chat_interval` per chat. Alerts
+    # for a chat that is still waiting are merged into its pending message.
+
+    def __init__(self, rate, chat_interval):
+        self.interval = 1 / rate
+        self.chat_interval = chat_interval
+        self.pending = {}
+        self.ready = deque()
+        self.last_sent = {}
+        self.wakeup = asyncio.Event()
+
+    def push(self, chat_id, text):
+        lines = self.pending.get(chat_id)
+        if lines is None:
+            self.pending[chat_id] = deque([text], maxlen=ALERT_COALESCE)
+            self.ready.append(chat_id)
+            self.wakeup.set()
+        else:
+            lines.append(text)
+
+    async def run(self, bot):
+        while True:
+            if not self.ready:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            chat_id = self.ready.popleft()
+            wait = self.last_sent.get(chat_id, 0) + self.chat_interval - time.monotonic()
+            if wait > 0:
+                self.ready.append(chat_id)
+                await asyncio.sleep(min(wait, self.interval))
+                continue
+            lines = self.pending.pop(chat_id, None)
+            if lines is None:
+                continue
+            try:
+                await bot.send_message(chat_id, "\n\n".join(lines))
+                ALERTS_SENT.inc("ok")
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None:
+                    ALERTS_SENT.inc("error")
+                    print(f"Error sending alert to {chat_id}: {e}")
+                else:
+                    # Flood control: put the message back and pause all sending.
+                    ALERTS_SENT.inc("retry")
+                    queued = self.pending.pop(chat_id, None)
+                    if queued is not None:
+                        # Alerts pushed during the send already queued this chat.
+                        lines.extend(queued)
+                        self.ready.remove(chat_id)
+                    self.pending[chat_id] = lines
+                    self.ready.appendleft(chat_id)
+                    if isinstance(retry_after, timedelta):
+                        retry_after = retry_after.total_seconds()
+                    await asyncio.sleep(retry_after)
+                    continue
+            self.last_sent[chat_id] = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+
+alert_engine = AlertEngine()
+alert_sender = AlertSender(ALERT_SEND_RATE, ALERT_CHAT_INTERVAL)
 
 
 async def start_telegram_bot():
@@ -160,29 +2204,73 @@ async def start_telegram_bot():
         print("TELEGRAM_TOKEN not set")
         return None
 
+    def timed(command, handler):
+        async def wrapper(update, context):
+            start = time.perf_counter()
+            try:
+                await handler(update, context)
+            finally:
+                TELEGRAM_SECONDS.observe(time.perf_counter() - start, command)
+        return wrapper
+
     async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        await update.message.reply_text("Bot aktif! Gunakan /atur <teks> untuk mengubah info treasury.")
+        await update.message.reply_text(
+            "Bot aktif! Gunakan /atur <teks> untuk mengubah info treasury, /alert untuk alert harga."
+        )
 
     async def atur_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        global treasury_info
         text = update.message.text.partition(' ')[2]
         if text:
             text = text.replace("  ", "&nbsp;&nbsp;")
             text = text.replace("\n", "<br>")
-            treasury_info = text
-            treasury_info_update_event.set()
+            set_treasury_info(text)
+            replicator.send({"t": "info", "text": text})
             await update.message.reply_text("Info Treasury berhasil diubah!")
         else:
             await update.message.reply_text("Gunakan: /atur <kalimat info>")
 
+    async def alert_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        parsed = parse_alert(context.args)
+        if parsed is None:
+            await update.message.reply_text(ALERT_USAGE)
+            return
+        rule = alert_engine.add(update.effective_chat.id, *parsed)
+        if rule is None:
+            await update.message.reply_text(f"Maksimal {ALERT_MAX_PER_CHAT} alert per chat. Hapus dulu dengan /hapus <id>.")
+        else:
+            await update.message.reply_text(f"Alert #{rule.id} aktif: {rule.describe()}")
+
+    async def daftar_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        rules = alert_engine.list(update.effective_chat.id)
+        if rules:
+            await update.message.reply_text("\n".join(f"#{rule.id} {rule.describe()}" for rule in rules))
+        else:
+            await update.message.reply_text("Belum ada alert.\n\n" + ALERT_USAGE)
+
+    async def hapus_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        if context.args == ["semua"]:
+            ids = [rule.id for rule in alert_engine.list(chat_id)]
+        elif len(context.args) == 1 and context.args[0].lstrip("#").isdigit():
+            ids = [int(context.args[0].lstrip("#"))]
+        else:
+            await update.message.reply_text("Gunakan: /hapus <id> atau /hapus semua")
+            return
+        removed = sum(alert_engine.remove(chat_id, rule_id) for rule_id in ids)
+        await update.message.reply_text(f"{removed} alert dihapus." if removed else "Alert tidak ditemukan.")
+
     try:
         telegram_app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
-        telegram_app.add_handler(CommandHandler("start", start_handler))
-        telegram_app.add_handler(CommandHandler("atur", atur_handler))
+        telegram_app.add_handler(CommandHandler("start", timed("start", start_handler)))
+        telegram_app.add_handler(CommandHandler("atur", timed("atur", atur_handler)))
+        telegram_app.add_handler(CommandHandler("alert", timed("alert", alert_handler)))
+        telegram_app.add_handler(CommandHandler("daftar", timed("daftar", daftar_handler)))
+        telegram_app.add_handler(CommandHandler("hapus", timed("hapus", hapus_handler)))
 
         await telegram_app.initialize()
         await telegram_app.start()
         await telegram_app.updater.start_polling(drop_pending_updates=True, allowed_updates=["message"])
+        background_tasks.append(asyncio.create_task(alert_sender.run(telegram_app.bot)))
 
         print("Telegram bot started")
         return telegram_app
@@ -210,38 +2298,7 @@ html = """
 <head>
     <title>Harga Emas Treasury</title>
     <link rel="stylesheet" href="https://cdn.datatables.net/1.13.6/css/jquery.dataTables.min.css"/>
-    <style>
-        body { font-family: Arial; margin: 40px; background: #fff; color: #222; transition: background 0.3s, color 0.3s; }
-        table.dataTable thead th { font-weight: bold; }
-        th.waktu, td.waktu { width: 150px; min-width: 100px; max-width: 180px; white-space: nowrap; text-align: left; }
-        th.profit, td.profit { width: 90px; min-width: 80px; max-width: 100px; white-space: nowrap; text-align: left; }
-        .dark-mode { background: #181a1b !important; color: #e0e0e0 !important; }
-        .dark-mode #jam { color: #ffb300 !important; }
-        .dark-mode table.dataTable { background: #23272b !important; color: #e0e0e0 !important; }
-        .dark-mode table.dataTable thead th { background: #23272b !important; color: #ffb300 !important; }
-        .dark-mode table.dataTable tbody td { background: #23272b !important; color: #e0e0e0 !important; }
-        .theme-toggle-btn { padding: 0; border: none; border-radius: 50%; background: #222; color: #fff; font-weight: bold; cursor: pointer; transition: background 0.3s, color 0.3s; font-size: 1.5em; width: 44px; height: 44px; display: flex; align-items: center; justify-content: center; }
-        .theme-toggle-btn:hover { background: #444; }
-        .dark-mode .theme-toggle-btn { background: #ffb300; color: #222; }
-        .dark-mode .theme-toggle-btn:hover { background: #ffd54f; }
-        .container-flex { display: flex; gap: 15px; margin-top: 10px; }
-        #usdIdrWidget { overflow: hidden; height: 370px; width: 630px; border: 1px solid #ccc; border-radius: 6px; }
-        #usdIdrRealtime { width: 248px; border: 1px solid #ccc; padding: 10px; height: 370px; overflow-y: auto; }
-        #priceList li { margin-bottom: 1px; }
-        .time { color: gray; font-size: 0.9em; margin-left: 10px; }
-        #currentPrice { color: red; font-weight: bold; }
-        .dark-mode #currentPrice { color: #00E124; text-shadow: 1px 1px #00B31C; }
-        #tabel tbody tr:first-child td { color: red !important; font-weight: bold; }
-        .dark-mode #tabel tbody tr:first-child td { color: #00E124 !important; font-weight: bold; }
-        #footerApp { width: 100%; overflow: hidden; position: fixed; bottom: 0; left: 0; background: transparent; text-align: center; z-index: 100; padding: 8px 0; }
-        .marquee-text { display: inline-block; color: #F5274D; animation: marquee 70s linear infinite; font-weight: bold; }
-        .dark-mode .marquee-text { color: #B232B2; font-weight: bold; }
-        @keyframes marquee { 0% { transform: translateX(100vw); } 100% { transform: translateX(-100vw); } }
-        #isiTreasury { white-space: pre-line; color: red; font-weight: bold; max-height: 376px; overflow-y: auto; scrollbar-width: none; -ms-overflow-style: none; word-break: break-word; }
-        #isiTreasury::-webkit-scrollbar { display: none; }
-        .dark-mode #isiTreasury { color: #00E124; text-shadow: 1px 1px #00B31C; }
-        #ingfo { width: 218px; border: 1px solid #ccc; padding: 10px; height: 378px; overflow-y: auto; }
-    </style>
+    <link rel="stylesheet" href="/static/app.css?v={{css_version}}"/>
 </head>
 <body>
     <div style="display: flex; align-items: center; justify-content: space-between; margin-bottom: 10px;">
@@ -256,9 +2313,10 @@ html = """
                 <th>Data Transaksi</th>
                 <th class="profit">Est. cuan 20 JT</th>
                 <th class="profit">Est. cuan 30 JT</th>
+                <th>#</th>
             </tr>
         </thead>
-        <tbody></tbody>
+        <tbody>{{rows}}</tbody>
     </table>
     <div style="margin-top:40px;">
         <h3>Chart Harga Emas (XAU/USD)</h3>
@@ -308,274 +2366,538 @@ html = """
         <div>
             <h3>Sekilas Ingfo Treasury</h3>
             <div id="ingfo" style="margin-top:0; padding-top:2px;">
-                <ul id="isiTreasury" style="list-style:none; padding-left:0;"></ul>
+                <ul id="isiTreasury" style="list-style:none; padding-left:0;">{{treasury_info}}</ul>
             </div>
         </div>
     </div>
     <script src="https://code.jquery.com/jquery-3.7.0.min.js"></script>
     <script src="https://cdn.datatables.net/1.13.6/js/jquery.dataTables.min.js"></script>
-    <script>
-        var table = $('#tabel').DataTable({
-            "pageLength": 4,
-            "lengthMenu": [4, 8, 18, 48, 88, 888, 1441],
-            "order": [],
-            "columns": [
-                { "data": "waktu" },
-                { "data": "all" },
-                { "data": "jt20" },
-                { "data": "jt30" }
-            ]
-        });
+    <script id="snapshot" type="application/json">{{snapshot}}</script>
+    <script src="/static/app.js?v={{js_version}}"></script>
+    <footer id="footerApp"><span class="marquee-text">&copy;2025 ~ahmadkholil~</span></footer>
+</body>
+</html>
+"""
 
-        function updateTable(history) {
-            history.sort(function(a, b) { return new Date(b.created_at) - new Date(a.created_at); });
-            var dataArr = history.map(function(d) {
-                return {
-                    waktu: d.created_at,
-                    all: (d.status || "➖") + " | Harga Beli: " + d.buying_rate + " | Harga Jual: " + d.selling_rate,
-                    jt20: d.jt20,
-                    jt30: d.jt30
-                };
-            });
-            table.clear();
-            table.rows.add(dataArr);
-            table.draw(false);
-            table.page('first').draw(false);
-        }
 
-        function connectWS() {
-            var ws = new WebSocket((location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws");
-            ws.onmessage = function(event) {
-                var data = JSON.parse(event.data);
-                if (data.history) updateTable(data.history);
-                if (data.usd_idr_history) updateUsdIdrPrice(data.usd_idr_history);
-                if (data.treasury_info !== undefined) updateTreasuryInfo(data.treasury_info);
-            };
-            ws.onclose = function() { setTimeout(connectWS, 1000); };
-        }
-        connectWS();
+class Asset:
+    # Response body with its strong ETag and lazily built gzip/brotli variants.
+    __slots__ = ("body", "media_type", "etag", "level", "variants")
 
-        function updateTreasuryInfo(info) {
-            document.getElementById("isiTreasury").innerHTML = info;
-        }
+    def __init__(self, body, media_type, level=9):
+        self.body = body
+        self.media_type = media_type
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.level = level
+        self.variants = {}
 
-        function updateUsdIdrPrice(history) {
-            const currentPriceEl = document.getElementById("currentPrice");
-            const priceListEl = document.getElementById("priceList");
-            function parseHarga(str) { return parseFloat(str.trim().replace(/\\./g, '').replace(',', '.')); }
-            const reversed = history.slice().reverse();
-            let rowIconCurrent = "➖";
-            if (reversed.length > 1) {
-                let now = parseHarga(reversed[0].price);
-                let prev = parseHarga(reversed[1].price);
-                if (now > prev) rowIconCurrent = "🚀";
-                else if (now < prev) rowIconCurrent = "🔻";
-            }
-            currentPriceEl.innerHTML = reversed[0].price + " " + rowIconCurrent;
-            priceListEl.innerHTML = "";
-            for (let i = 0; i < reversed.length; i++) {
-                let rowIcon = "➖";
-                if (i === 0 && reversed.length > 1) {
-                    let now = parseHarga(reversed[0].price);
-                    let prev = parseHarga(reversed[1].price);
-                    if (now > prev) rowIcon = "🟢";
-                    else if (now < prev) rowIcon = "🔴";
-                } else if (i < reversed.length - 1) {
-                    let now = parseHarga(reversed[i].price);
-                    let next = parseHarga(reversed[i+1].price);
-                    if (now > next) rowIcon = "🟢";
-                    else if (now < next) rowIcon = "🔴";
-                } else if (i === reversed.length - 1 && reversed.length > 1) {
-                    let now = parseHarga(reversed[i].price);
-                    let prev = parseHarga(reversed[i-1].price);
-                    if (now > prev) rowIcon = "🟢";
-                    else if (now < prev) rowIcon = "🔴";
-                }
-                const li = document.createElement("li");
-                li.textContent = reversed[i].price + " ";
-                const spanTime = document.createElement("span");
-                spanTime.className = "time";
-                spanTime.textContent = "(" + reversed[i].time + ")";
-                li.appendChild(spanTime);
-                const iconSpan = document.createElement("span");
-                iconSpan.textContent = " " + rowIcon;
-                li.appendChild(iconSpan);
-                priceListEl.appendChild(li);
-            }
-        }
+    def variant(self, encoding):
+        data = self.variants.get(encoding)
+        if data is None:
+            if encoding == "br":
+                data = brotli.compress(self.body, quality=min(11, self.level + 2))
+            else:
+                data = gzip.compress(self.body, compresslevel=self.level)
+            self.variants[encoding] = data
+        return data
+
+    def precompress(self):
+        for encoding in ("br", "gzip") if brotli else ("gzip",):
+            self.variant(encoding)
+        return self
+
+
+def load_static_assets():
+    assets = {}
+    for name, media_type in (("app.css", "text/css; charset=utf-8"), ("app.js", "application/javascript; charset=utf-8")):
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            assets[name] = Asset(f.read(), media_type)
+    return assets
+
+
+static_assets = load_static_assets()
+index_template = (
+    html.replace("{{css_version}}", static_assets["app.css"].etag)
+    .replace("{{js_version}}", static_assets["app.js"].etag)
+)
+index_cache = None
+
+
+def prerender_row(row, key):
+    cells = (
+        row["created_at"],
+        f"{row['status'] or '➖'} | Harga Beli: {row['buying_rate']} | Harga Jual: {row['selling_rate']}",
+        row["jt20"],
+        row["jt30"],
+        key,
+    )
+    return "<tr>" + "".join(f"<td>{escape(str(cell))}</td>" for cell in cells) + "</tr>"
+
+
+def build_index(rows, treasury_info, snapshot_json):
+    page = (
+        index_template.replace("{{rows}}", "".join(prerender_row(row, len(rows) - i) for i, row in enumerate(rows)))
+        .replace("{{treasury_info}}", treasury_info)
+        .replace("{{snapshot}}", snapshot_json.replace("</", "<\\/"))
+    )
+    return Asset(page.encode(), "text/html; charset=utf-8", level=5)
+
+
+async def render_index():
+    # Rebuilt at most once per published seq; the page carries the first table page
+    # pre-rendered plus the full snapshot so nothing waits for the WebSocket. The
+    # inputs are taken on the loop, the ~120 KB render runs in a worker thread and
+    # concurrent requests for the same seq share it.
+    global index_cache
+    snapshot = current_snapshot()
+    if index_cache is None or index_cache[0] is not snapshot:
+        rows = list(published["history"])[-INDEX_PRERENDER_ROWS:][::-1]
+        task = asyncio.ensure_future(asyncio.to_thread(
+            build_index, rows, published["treasury_info"], snapshot.encode("columnar")[0]
+        ))
+        index_cache = (snapshot, task)
+    return await asyncio.shield(index_cache[1])
+
+
+def accepted_encoding(request):
+    accepted = {token.split(";")[0].strip() for token in request.headers.get("accept-encoding", "").split(",")}
+    if "br" in accepted and brotli:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
 
-        function updateJam() {
-            var now = new Date();
-            var tgl = now.toLocaleDateString('id-ID', { day: '2-digit', month: 'long', year: 'numeric' });
-            var jam = now.toLocaleTimeString('id-ID', { hour12: false });
-            document.getElementById("jam").textContent = tgl + " " + jam + " WIB";
-        }
-        setInterval(updateJam, 1000);
-        updateJam();
-
-        function toggleTheme() {
-            var body = document.body;
-            var btn = document.getElementById('themeBtn');
-            body.classList.toggle('dark-mode');
-            if (body.classList.contains('dark-mode')) {
-                btn.textContent = "☀️";
-                localStorage.setItem('theme', 'dark');
-            } else {
-                btn.textContent = "🌙";
-                localStorage.setItem('theme', 'light');
-            }
-        }
-        (function() {
-            var theme = localStorage.getItem('theme');
-            var btn = document.getElementById('themeBtn');
-            if (theme === 'dark') {
-                document.body.classList.add('dark-mode');
-                btn.textContent = "☀️";
-            } else {
-                btn.textContent = "🌙";
-            }
-        })();
-    </script>
-    <footer id="footerApp"><span class="marquee-text">&copy;2025 ~ahmadkholil~</span></footer>
-</body>
-</html>
-"""
+
+def asset_response(request, asset, cache_control):
+    encoding = accepted_encoding(request)
+    etag = f'"{asset.etag}-{encoding}"' if encoding else f'"{asset.etag}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(asset.variant(encoding), media_type=asset.media_type, headers=headers)
+    return Response(asset.body, media_type=asset.media_type, headers=headers)
+
+
+def load_tick_store():
+    tick_store.start()
+    since = time.time() - CANDLE_WARM_HOURS * 3600
+    return tick_store.load_gold(HISTORY_WINDOW, since), tick_store.load_fx(11)
+
+
+async def warm_start():
+    global last_buy, usd_idr_total
+    try:
+        gold, fx = await asyncio.wait_for(asyncio.to_thread(load_tick_store), TICK_STORE_LOAD_TIMEOUT)
+    except Exception as e:
+        print(f"Error loading tick store: {e!r}")
+        return
+
+    for buying_rate, selling_rate, status, created_at, ts in gold:
+        candles.add(ts, buying_rate, selling_rate)
+    for buying_rate, selling_rate, status, created_at, ts in gold[-HISTORY_WINDOW:]:
+        history.append(Tick(buying_rate, selling_rate, status, created_at, ts))
+    profit_engine.update(history)
+    for buying_rate, selling_rate, status, created_at, ts in gold[-STATS_WINDOW:]:
+        rolling_stats.add_gold(ts, buying_rate, selling_rate)
+    for row in fx:
+        price = parse_fx_price(row["price"])
+        if price:
+            rolling_stats.add_fx(price)
+    if gold:
+        last_buy = gold[-1][0]
+    usd_idr_history.extend(fx)
+    usd_idr_total += len(fx)
+    # Clients may already be connected, so the loaded rows go out as a normal delta.
+    change_feed.publish("gold")
+    change_feed.publish("fx")
+    print(f"Tick store loaded {len(gold)} gold ticks and {len(fx)} USD/IDR points")
+
+
+async def loop_lag_monitor(interval=0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - expected))
+
+
+startup_timings = {}
+
+
+def record_startup(stage, started):
+    seconds = time.perf_counter() - started
+    startup_timings[stage] = seconds
+    STARTUP_SECONDS.set(seconds, stage)
+    print(f"Startup {stage}: {seconds * 1000:.0f} ms")
+
+
+def precompress_assets():
+    for asset in static_assets.values():
+        asset.precompress()
+
+
+async def warm_up():
+    # Work that is not needed to answer the first request runs once the server is up.
+    started = time.perf_counter()
+    await asyncio.to_thread(precompress_assets)
+    record_startup("precompress", started)
+
+
+async def start_ingest():
+    global tick_store
+    # Import NumPy off the event loop before the first ticks reach ProfitEngine.
+    started = time.perf_counter()
+    await asyncio.to_thread(profit_engine.load)
+    record_startup("numpy", started)
+    if tick_store:
+        if history:
+            # Promoted follower: memory is already current, the store only needs its writer.
+            try:
+                await asyncio.to_thread(tick_store.start)
+            except Exception as e:
+                print(f"Error starting tick store: {e!r}")
+        else:
+            started = time.perf_counter()
+            await warm_start()
+            record_startup("tick_store", started)
+    if tick_store and tick_store.thread is None:
+        # Bad path, read-only disk or a locked database: run without persistence.
+        print("Tick store unavailable, ticks will not be persisted")
+        tick_store = None
+    if tick_store:
+        try:
+            alert_engine.load(await asyncio.to_thread(tick_store.load_alerts))
+        except Exception as e:
+            print(f"Error loading alerts: {e!r}")
+    if INGEST_MODE == "auto":
+        await replicator.start()
+    background_tasks.append(asyncio.create_task(api_loop()))
+    background_tasks.append(asyncio.create_task(usd_idr_loop()))
+    started = time.perf_counter()
+    await start_telegram_bot()
+    record_startup("telegram", started)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    task1 = asyncio.create_task(api_loop())
-    task2 = asyncio.create_task(usd_idr_loop())
-    await start_telegram_bot()
+    background_tasks.append(asyncio.create_task(broadcast_loop()))
+    background_tasks.append(asyncio.create_task(loop_lag_monitor()))
+    if INGEST_MODE == "auto" and not acquire_ingest_lock():
+        print("Ingest lock held by another worker, running as follower")
+        background_tasks.append(asyncio.create_task(follower_loop()))
+    else:
+        # Ingest (tick store load, Telegram) starts in the background so the server
+        # accepts connections right away; clients get the loaded rows as a delta.
+        background_tasks.append(asyncio.create_task(start_ingest()))
+    background_tasks.append(asyncio.create_task(warm_up()))
+    record_startup("ready", STARTUP_BEGAN)
     yield
-    task1.cancel()
-    task2.cancel()
+    for task in background_tasks:
+        task.cancel()
     await stop_telegram_bot()
+    await replicator.stop()
     try:
-        await asyncio.gather(task1, task2, return_exceptions=True)
+        await asyncio.gather(*background_tasks, return_exceptions=True)
     except:
         pass
+    await fx_aggregator.aclose()
+    fx_executor.shutdown(wait=False, cancel_futures=True)
+    if tick_store:
+        await asyncio.to_thread(tick_store.stop)
 
 
 app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/", response_class=HTMLResponse)
-async def index():
-    return HTMLResponse(html)
+async def index(request: Request):
+    asset = await render_index()
+    encoding = accepted_encoding(request)
+    if encoding and encoding not in asset.variants and asset.etag not in request.headers.get("if-none-match", ""):
+        # Brotli on the page costs ~12 ms per seq; keep it off the event loop too.
+        await asyncio.to_thread(asset.variant, encoding)
+    return asset_response(request, asset, "no-cache")
 
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    active_connections.add(websocket)
-    last_sent_updated_at = None
-    last_usd_idr_price = None
-    last_treasury_info = treasury_info
+@app.get("/static/{name}")
+async def static_file(request: Request, name: str):
+    asset = static_assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404)
+    # Versioned URLs (?v=<etag>) never change content, so browsers may keep them forever.
+    if request.query_params.get("v") == asset.etag:
+        return asset_response(request, asset, "public, max-age=31536000, immutable")
+    return asset_response(request, asset, "no-cache")
 
-    if history:
-        last_sent_updated_at = history[-1]["created_at"]
-    if usd_idr_history:
-        last_usd_idr_price = usd_idr_history[-1]["price"]
 
-    def calc_20jt(h):
-        try:
-            val = int((20000000 / h["buying_rate"]) * h["selling_rate"] - 19315000)
-            if val > 0:
-                return f"+{format_rupiah(val)} 🟢"
-            elif val < 0:
-                return f"-{format_rupiah(abs(val))} 🔴"
-            else:
-                return "0 ➖"
-        except:
-            return "-"
+@app.get("/metrics")
+async def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/startup")
+async def get_startup():
+    return {"stages": startup_timings, "uptime": time.perf_counter() - STARTUP_BEGAN}
+
+
+@app.get("/api/poller")
+async def poller_stats():
+    return (replicated_status or ingest_status())["poller"]
+
+
+@app.get("/api/history")
+async def get_history(
+    request: Request,
+    start: float = None,
+    end: float = float("inf"),
+    cursor: float = 0,
+    limit: int = 1000,
+    points: int = 0,
+    method: str = "lttb",
+    field: str = "buy",
+):
+    if method not in DOWNSAMPLERS or field not in HISTORY_FIELDS:
+        raise HTTPException(status_code=400, detail="method must be lttb|minmax and field buy|sell|spread")
+    if points and points < 3:
+        raise HTTPException(status_code=400, detail="points must be 0 or at least 3")
+
+    etag = '"%d-%08x"' % (history.total, zlib.crc32(str(request.query_params).encode()))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
 
-    def calc_30jt(h):
+    # Downsampled requests read the whole range; plain ones are paged by cursor.
+    limit = HISTORY_QUERY_MAX if points else max(1, min(limit, HISTORY_PAGE_MAX))
+    oldest = history[0].ts if history else float("inf")
+
+    def downsample(rows):
+        # Up to HISTORY_QUERY_MAX rows in pure Python: kept off the event loop.
+        return DOWNSAMPLERS[method](rows, points, HISTORY_FIELDS[field]) if points else rows
+
+    def query_store():
+        return downsample(tick_store.query_gold(start, min(end, 1e12), cursor, limit))
+
+    rows = None
+    if tick_store and start is not None and start < oldest:
         try:
-            val = int((30000000 / h["buying_rate"]) * h["selling_rate"] - 28980000)
-            if val > 0:
-                return f"+{format_rupiah(val)} 🟢"
-            elif val < 0:
-                return f"-{format_rupiah(abs(val))} 🔴"
-            else:
-                return "0 ➖"
-        except:
-            return "-"
-
-    def build_history_data():
-        return [
-            {
-                "buying_rate": format_rupiah(h["buying_rate"]),
-                "selling_rate": format_rupiah(h["selling_rate"]),
-                "status": h["status"],
-                "created_at": h["created_at"],
-                "jt20": calc_20jt(h) if h["buying_rate"] and h["selling_rate"] else "-",
-                "jt30": calc_30jt(h) if h["buying_rate"] and h["selling_rate"] else "-"
-            }
-            for h in history[-1441:]
+            rows = await asyncio.to_thread(query_store)
+        except sqlite3.Error as e:
+            print(f"Error querying tick store: {e}")
+    if rows is None:
+        # The in-memory history is only safe to iterate on the event loop.
+        rows = query_history(start or 0, end, cursor, limit)
+        if points:
+            rows = await asyncio.to_thread(downsample, rows)
+
+    next_cursor = None
+    if not points and len(rows) == limit:
+        next_cursor = rows[-1][0]
+
+    return JSONResponse({
+        "version": history.total,
+        "next_cursor": next_cursor,
+        "rows": [
+            {"ts": ts, "created_at": created_at, "buying_rate": buy, "selling_rate": sell, "status": status}
+            for ts, created_at, buy, sell, status in rows
         ]
+    }, headers=headers)
+
+
+@app.get("/api/profit")
+async def get_profit(request: Request, limit: int = 1000, scenario: str = ""):
+    names = scenario.split(",") if scenario else profit_engine.names
+    unknown = [name for name in names if name not in profit_engine.names]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"scenario must be any of {', '.join(profit_engine.names)}")
+    if not profit_engine.ready:
+        # NumPy is still loading in the ingest path; importing it here would block the loop.
+        raise HTTPException(status_code=503, detail="profit engine is still starting")
 
+    etag = '"%d-%08x"' % (history.total, zlib.crc32(str(request.query_params).encode()))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    ticks = history.since(history.total - max(1, min(limit, HISTORY_WINDOW)))
+    values = profit_engine.window(len(ticks))
+    columns = [profit_engine.names.index(name) for name in names]
+    return JSONResponse({
+        "version": history.total,
+        "scenarios": [s for s in profit_engine.scenarios() if s["name"] in names],
+        "columns": ["ts", "created_at", "buying_rate", "selling_rate"] + names,
+        "values": [
+            [t.ts for t in ticks],
+            [t.created_at for t in ticks],
+            [t.buying_rate for t in ticks],
+            [t.selling_rate for t in ticks],
+        ] + values[:, columns].T.tolist()
+    }, headers=headers)
+
+
+@app.get("/api/fx")
+async def get_fx():
+    return (replicated_status or ingest_status())["fx"]
+
+
+@app.get("/api/stats")
+async def get_stats():
+    return rolling_stats.summary()
+
+
+@app.get("/api/candles")
+async def get_candles(tf: str = "1m", limit: int = 500):
+    if tf not in CANDLE_TIMEFRAMES:
+        raise HTTPException(status_code=400, detail=f"tf must be one of {', '.join(CANDLE_TIMEFRAMES)}")
+    return {"tf": tf, "candles": candles.get(tf, max(1, min(limit, CANDLE_LIMIT)))}
+
+
+async def receive_loop(websocket, queue):
     try:
-        await websocket.send_text(json.dumps({
-            "history": build_history_data(),
-            "usd_idr_history": usd_idr_history,
-            "treasury_info": treasury_info
-        }))
+        while True:
+            message = orjson.loads(await websocket.receive_text())
+            if message.get("type") == "resync":
+                enqueue(queue, SEND_SNAPSHOT)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket receive error: {e}")
+    finally:
+        enqueue(queue, CLOSE)
+
+
+async def send_message(websocket, message, fmt):
+    data, size = message.encode(fmt)
+    start = time.perf_counter()
+    if isinstance(data, bytes):
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
+    WS_SEND_SECONDS.observe(time.perf_counter() - start, fmt)
+    WS_SENT_BYTES.inc(fmt, amount=size)
+    WS_SENT_MESSAGES.inc(fmt)
+
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, since: int = None, fmt: str = Query("json", alias="format")):
+    await websocket.accept()
+    if fmt not in WIRE_FORMATS:
+        fmt = "json"
+    queue = asyncio.Queue(maxsize=WS_SEND_QUEUE)
+    active_connections[websocket] = queue
+    try:
+        # A page that embedded snapshot `since` only needs the deltas after it.
+        for message in messages_since(since):
+            await send_message(websocket, message, fmt)
     except Exception as e:
         print(f"Error sending initial data: {e}")
-        active_connections.discard(websocket)
+        active_connections.pop(websocket, None)
         return
 
+    reader = asyncio.create_task(receive_loop(websocket, queue))
     try:
         while True:
-            wait_tasks = [
-                asyncio.create_task(update_event.wait()),
-                asyncio.create_task(usd_idr_update_event.wait()),
-                asyncio.create_task(treasury_info_update_event.wait())
-            ]
-            done, pending = await asyncio.wait(wait_tasks, return_when=asyncio.FIRST_COMPLETED)
-            for task in pending:
-                task.cancel()
-
-            if update_event.is_set():
-                update_event.clear()
-            if usd_idr_update_event.is_set():
-                usd_idr_update_event.clear()
-            if treasury_info_update_event.is_set():
-                treasury_info_update_event.clear()
-
-            current_updated_at = history[-1]["created_at"] if history else None
-            current_usd_idr_price = usd_idr_history[-1]["price"] if usd_idr_history else None
-            current_treasury_info = treasury_info
-
-            send_update = False
-            if current_updated_at != last_sent_updated_at:
-                send_update = True
-                last_sent_updated_at = current_updated_at
-            if current_usd_idr_price != last_usd_idr_price:
-                send_update = True
-                last_usd_idr_price = current_usd_idr_price
-            if current_treasury_info != last_treasury_info:
-                send_update = True
-                last_treasury_info = current_treasury_info
-
-            if send_update:
-                await websocket.send_text(json.dumps({
-                    "history": build_history_data(),
-                    "usd_idr_history": usd_idr_history,
-                    "treasury_info": treasury_info
-                }))
-            else:
-                await websocket.send_text(json.dumps({"ping": True}))
+            message = await queue.get()
+            if message is CLOSE:
+                break
+            if message is SEND_SNAPSHOT:
+                message = current_snapshot()
+            async with asyncio.timeout(WS_SEND_TIMEOUT):
+                await send_message(websocket, message, fmt)
 
     except WebSocketDisconnect:
         pass
+    except TimeoutError:
+        WS_DROPPED.inc()
+        print("WebSocket client too slow, dropped")
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
-        active_connections.discard(websocket)
+        active_connections.pop(websocket, None)
+        reader.cancel()
+
+
+@app.get("/sse")
+async def sse_endpoint(request: Request, since: int = None, fmt: str = Query("json", alias="format")):
+    if fmt not in TEXT_FORMATS:
+        fmt = "json"
+    queue = asyncio.Queue(maxsize=WS_SEND_QUEUE)
+
+    async def stream():
+        # Same queue and overflow handling as /ws; the request object is the key.
+        active_connections[request] = queue
+        try:
+            for message in messages_since(since):
+                yield message.sse(fmt)
+            while True:
+                message = await queue.get()
+                if message is SEND_SNAPSHOT:
+                    message = current_snapshot()
+                yield message.sse(fmt)
+        finally:
+            active_connections.pop(request, None)
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/poll")
+async def long_poll(since: int = None, fmt: str = Query("json", alias="format")):
+    if fmt not in TEXT_FORMATS:
+        fmt = "json"
+    if since == published["seq"]:
+        # Up to date: park on the shared future until the next delta goes out.
+        try:
+            async with asyncio.timeout(POLL_TIMEOUT):
+                await delivery_feed.wait(delivery_feed.version)
+        except TimeoutError:
+            pass
+    body = "[" + ",".join(message.encode(fmt)[0] for message in messages_since(since)) + "]"
+    return Response(body, media_type="application/json", headers={"Cache-Control": "no-store"})
+
+
+@app.websocket("/ws/candles")
+async def candles_endpoint(websocket: WebSocket, tf: str = "1m"):
+    await websocket.accept()
+    if tf not in CANDLE_TIMEFRAMES:
+        await websocket.close(code=1008)
+        return
+
+    version = change_feed.version
+    gold_version = change_feed.versions["gold"]
+    try:
+        await websocket.send_text(encode_json({"type": "snapshot", "tf": tf, "candles": candles.get(tf, CANDLE_LIMIT)}))
+        while True:
+            try:
+                async with asyncio.timeout(WS_PING_INTERVAL):
+                    version = await change_feed.wait(version)
+            except TimeoutError:
+                message = encode_json({"type": "ping"})
+            else:
+                if change_feed.versions["gold"] == gold_version:
+                    continue
+                gold_version = change_feed.versions["gold"]
+                message = candles.update_message(tf)
+            async with asyncio.timeout(WS_SEND_TIMEOUT):
+                await websocket.send_text(message)
+
+    except WebSocketDisconnect:
+        pass
+    except TimeoutError:
+        print("Candle client too slow, dropped")
+    except Exception as e:
+        print(f"Candle WebSocket error: {e}")
+
+
+record_startup("import", STARTUP_BEGAN)
 
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        app, host="0.0.0.0", port=8000, ws_per_message_deflate=WS_DEFLATE,
+        loop="auto" if sys.platform == "win32" else "uvloop", http="httptools"
+    )
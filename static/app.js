@@ -0,0 +1,341 @@
+var table = $('#tabel').DataTable({
+    "pageLength": 4,
+    "lengthMenu": [4, 8, 18, 48, 88, 888, 1441],
+    // Rows are keyed by arrival order from the server, so the newest row sorts first
+    // without parsing any dates.
+    "order": [[4, "desc"]],
+    "columns": [
+        { "data": "waktu", "orderable": false },
+        { "data": "all", "orderable": false },
+        { "data": "jt20", "orderable": false },
+        { "data": "jt30", "orderable": false },
+        { "data": "key", "visible": false, "type": "num" }
+    ]
+});
+
+var nextKey = 0;
+var renderedRows = [];
+var tableRebuild = false;
+var usdIdrDirty = false;
+var framePending = false;
+
+function tableRow(d) {
+    return {
+        waktu: d.created_at,
+        all: (d.status || "➖") + " | Harga Beli: " + d.buying_rate + " | Harga Jual: " + d.selling_rate,
+        jt20: d.jt20,
+        jt30: d.jt30,
+        key: d._key
+    };
+}
+
+function keyRows(rows) {
+    for (var i = 0; i < rows.length; i++) rows[i]._key = nextKey++;
+    return rows;
+}
+
+function scheduleRender() {
+    if (framePending) return;
+    framePending = true;
+    requestAnimationFrame(flushRender);
+}
+
+function flushRender() {
+    framePending = false;
+    renderTable();
+    if (usdIdrDirty) {
+        usdIdrDirty = false;
+        if (usdIdrRows.length) updateUsdIdrPrice(usdIdrRows);
+    }
+}
+
+function renderTable() {
+    // Diff the row model against what DataTables holds: drop evicted keys from the
+    // front, add new keys at the back, then redraw once per animation frame.
+    var changed = false;
+    if (tableRebuild) {
+        tableRebuild = false;
+        table.clear();
+        renderedRows = [];
+        changed = true;
+    }
+    var firstKey = historyRows.length ? historyRows[0]._key : Infinity;
+    var evict = 0;
+    while (evict < renderedRows.length && renderedRows[evict].key < firstKey) evict++;
+    if (evict) {
+        table.rows(renderedRows.splice(0, evict).map(function(r) { return r.node; })).remove();
+        changed = true;
+    }
+    var lastKey = renderedRows.length ? renderedRows[renderedRows.length - 1].key : -1;
+    var added = historyRows.filter(function(d) { return d._key > lastKey; });
+    if (added.length) {
+        var nodes = table.rows.add(added.map(tableRow)).nodes().toArray();
+        for (var i = 0; i < added.length; i++) renderedRows.push({ key: added[i]._key, node: nodes[i] });
+        changed = true;
+    }
+    if (changed) {
+        table.page('first');
+        table.draw(false);
+    }
+}
+
+var seq = null;
+var historyRows = [];
+var usdIdrRows = [];
+var historyMax = 1441;
+var USD_IDR_MAX = 11;
+
+var wireFormat = new URLSearchParams(location.search).get("format") || "json";
+// SSE and long-poll are text-only, so msgpack users get the columnar JSON there.
+var textFormat = wireFormat === "msgpack" ? "columnar" : wireFormat;
+
+function fromColumns(data) {
+    if (Array.isArray(data)) return data;
+    var rows = [];
+    var n = data.values.length ? data.values[0].length : 0;
+    for (var i = 0; i < n; i++) {
+        var row = {};
+        for (var c = 0; c < data.columns.length; c++) row[data.columns[c]] = data.values[c][i];
+        rows.push(row);
+    }
+    return rows;
+}
+
+function decodeMessage(raw) {
+    return normalizeMessage(typeof raw === "string" ? JSON.parse(raw) : MessagePack.decode(new Uint8Array(raw)));
+}
+
+function normalizeMessage(data) {
+    if (data.history) {
+        if (data.type === "snapshot") data.history = fromColumns(data.history);
+        else data.history.append = fromColumns(data.history.append);
+    }
+    if (data.usd_idr_history) {
+        if (data.type === "snapshot") data.usd_idr_history = fromColumns(data.usd_idr_history);
+        else data.usd_idr_history.append = fromColumns(data.usd_idr_history.append);
+    }
+    return data;
+}
+
+function applyDelta(rows, delta, max) {
+    rows.push.apply(rows, keyRows(delta.append));
+    if (delta.evict) rows.splice(0, delta.evict);
+    if (rows.length > max) rows.splice(0, rows.length - max);
+}
+
+function handleMessage(data, resync) {
+    if (data.type === "snapshot") {
+        // Already showing this exact state (e.g. the snapshot embedded in the page).
+        if (data.seq === seq) return;
+        seq = data.seq;
+        historyRows = keyRows(data.history);
+        historyMax = data.history_window;
+        usdIdrRows = keyRows(data.usd_idr_history);
+        tableRebuild = true;
+        usdIdrDirty = true;
+        scheduleRender();
+        updateTreasuryInfo(data.treasury_info);
+        return;
+    }
+    if (seq === null || data.seq <= seq) return;
+    if (data.type === "ping" || data.seq !== seq + 1) {
+        seq = null;
+        resync();
+        return;
+    }
+    seq = data.seq;
+    if (data.history) {
+        applyDelta(historyRows, data.history, historyMax);
+        scheduleRender();
+    }
+    if (data.usd_idr_history) {
+        applyDelta(usdIdrRows, data.usd_idr_history, USD_IDR_MAX);
+        usdIdrDirty = true;
+        scheduleRender();
+    }
+    if (data.treasury_info !== undefined) updateTreasuryInfo(data.treasury_info);
+}
+
+// Transports in order of preference. A transport that fails twice in a row without
+// ever connecting is treated as blocked (e.g. a proxy dropping WebSockets) and the
+// next one is tried.
+var transports = ["ws", "sse", "poll"];
+var transportIndex = 0;
+var failures = 0;
+
+function connect() {
+    if (transports[transportIndex] === "ws") connectWS();
+    else if (transports[transportIndex] === "sse") connectSSE();
+    else connectPoll();
+}
+
+function transportLost(opened) {
+    seq = null;
+    failures = opened ? 0 : failures + 1;
+    if (failures >= 2 && transportIndex < transports.length - 1) {
+        transportIndex++;
+        failures = 0;
+    }
+    setTimeout(connect, 1000);
+}
+
+function applyMessages(text, resync) {
+    JSON.parse(text).forEach(function(data) { handleMessage(normalizeMessage(data), resync); });
+}
+
+function resyncByPoll() {
+    fetch("/poll?format=" + textFormat, { cache: "no-store" })
+        .then(function(response) { return response.text(); })
+        .then(function(text) { applyMessages(text, resyncByPoll); });
+}
+
+// With a known seq (the embedded snapshot, or a live stream) the server only sends
+// what came after it instead of a second full snapshot.
+function sinceParam() {
+    return seq === null ? "" : "&since=" + seq;
+}
+
+function connectWS() {
+    if (!window.WebSocket) return transportLost(false);
+    var opened = false;
+    var ws = new WebSocket((location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws?format=" + wireFormat + sinceParam());
+    ws.binaryType = "arraybuffer";
+    ws.onopen = function() { opened = true; };
+    ws.onmessage = function(event) {
+        handleMessage(decodeMessage(event.data), function() { ws.send(JSON.stringify({ type: "resync" })); });
+    };
+    ws.onclose = function() { transportLost(opened); };
+}
+
+function connectSSE() {
+    if (!window.EventSource) return transportLost(false);
+    var opened = false;
+    var source = new EventSource("/sse?format=" + textFormat + sinceParam());
+    source.onopen = function() { opened = true; };
+    source.onmessage = function(event) {
+        opened = true;
+        handleMessage(decodeMessage(event.data), resyncByPoll);
+    };
+    source.onerror = function() {
+        // Take over reconnection from EventSource so failures are counted here.
+        source.close();
+        transportLost(opened);
+    };
+}
+
+function connectPoll() {
+    fetch("/poll?format=" + textFormat + sinceParam(), { cache: "no-store" })
+        .then(function(response) {
+            if (!response.ok) throw new Error("poll failed: " + response.status);
+            return response.text();
+        })
+        .then(function(text) {
+            applyMessages(text, function() { seq = null; });
+            connectPoll();
+        })
+        .catch(function() { transportLost(true); });
+}
+
+// The page embeds the snapshot it was rendered from, so the table is filled before the socket opens.
+var initialSnapshot = document.getElementById("snapshot");
+if (initialSnapshot && initialSnapshot.textContent) handleMessage(decodeMessage(initialSnapshot.textContent));
+
+if (wireFormat === "msgpack") {
+    var msgpackScript = document.createElement("script");
+    msgpackScript.src = "https://cdn.jsdelivr.net/npm/@msgpack/msgpack@2.8.0/dist.es5+umd/msgpack.min.js";
+    msgpackScript.onload = connect;
+    document.head.appendChild(msgpackScript);
+} else {
+    connect();
+}
+
+function updateTreasuryInfo(info) {
+    document.getElementById("isiTreasury").innerHTML = info;
+}
+
+function parseHarga(str) { return parseFloat(str.trim().replace(/\./g, '').replace(',', '.')); }
+
+function usdIdrIcon(reversed, i) {
+    // Each row compares with the older row below it; the oldest row compares with the one above.
+    var j = i < reversed.length - 1 ? i + 1 : i - 1;
+    if (j < 0) return "➖";
+    var now = parseHarga(reversed[i].price);
+    var other = parseHarga(reversed[j].price);
+    if (now > other) return "🟢";
+    if (now < other) return "🔴";
+    return "➖";
+}
+
+var priceItems = [];
+
+function updateUsdIdrPrice(history) {
+    const currentPriceEl = document.getElementById("currentPrice");
+    const priceListEl = document.getElementById("priceList");
+    const reversed = history.slice().reverse();
+    let rowIconCurrent = "➖";
+    if (reversed.length > 1) {
+        let now = parseHarga(reversed[0].price);
+        let prev = parseHarga(reversed[1].price);
+        if (now > prev) rowIconCurrent = "🚀";
+        else if (now < prev) rowIconCurrent = "🔻";
+    }
+    currentPriceEl.innerHTML = reversed[0].price + " " + rowIconCurrent;
+
+    // Keep the <li> nodes keyed like the rows: remove ones that left the window, insert
+    // new ones at the top, then only refresh the icon text.
+    const keys = {};
+    reversed.forEach(function(row) { keys[row._key] = true; });
+    priceItems = priceItems.filter(function(item) {
+        if (keys[item.key]) return true;
+        item.li.remove();
+        return false;
+    });
+    const newestKey = priceItems.length ? priceItems[0].key : -1;
+    const fresh = [];
+    for (let i = 0; i < reversed.length && reversed[i]._key > newestKey; i++) {
+        const li = document.createElement("li");
+        li.textContent = reversed[i].price + " ";
+        const spanTime = document.createElement("span");
+        spanTime.className = "time";
+        spanTime.textContent = "(" + reversed[i].time + ")";
+        li.appendChild(spanTime);
+        const iconSpan = document.createElement("span");
+        li.appendChild(iconSpan);
+        fresh.push({ key: reversed[i]._key, li: li, icon: iconSpan });
+    }
+    for (let i = fresh.length - 1; i >= 0; i--) priceListEl.insertBefore(fresh[i].li, priceListEl.firstChild);
+    priceItems = fresh.concat(priceItems);
+    for (let i = 0; i < priceItems.length; i++) priceItems[i].icon.textContent = " " + usdIdrIcon(reversed, i);
+}
+
+function updateJam() {
+    var now = new Date();
+    var tgl = now.toLocaleDateString('id-ID', { day: '2-digit', month: 'long', year: 'numeric' });
+    var jam = now.toLocaleTimeString('id-ID', { hour12: false });
+    document.getElementById("jam").textContent = tgl + " " + jam + " WIB";
+}
+setInterval(updateJam, 1000);
+updateJam();
+
+function toggleTheme() {
+    var body = document.body;
+    var btn = document.getElementById('themeBtn');
+    body.classList.toggle('dark-mode');
+    if (body.classList.contains('dark-mode')) {
+        btn.textContent = "☀️";
+        localStorage.setItem('theme', 'dark');
+    } else {
+        btn.textContent = "🌙";
+        localStorage.setItem('theme', 'light');
+    }
+}
+(function() {
+    var theme = localStorage.getItem('theme');
+    var btn = document.getElementById('themeBtn');
+    if (theme === 'dark') {
+        document.body.classList.add('dark-mode');
+        btn.textContent = "☀️";
+    } else {
+        btn.textContent = "🌙";
+    }
+})();